@@ -0,0 +1,61 @@
+import calendar
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Return a strong ETag for the given validator values"""
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    return quote_etag(digest)
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GET requests from cheap validators, before the
+    response is serialized. Views implement get_validators and wrap their
+    handlers with conditional_response
+    """
+
+    def get_validators(self, request, *args, **kwargs):
+        """
+        Return (etag, last_modified) for the requested resource, where
+        etag comes from make_etag and last_modified is a datetime or None.
+        Return None to skip conditional handling
+        """
+        raise NotImplementedError
+
+    def get_content_encoding(self, request):
+        """
+        Return the content coding the handler compresses the response
+        with, or None for an uncompressed body
+        """
+        return None
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        validators = self.get_validators(request, *args, **kwargs)
+        if validators is None:
+            return handler(request, *args, **kwargs)
+
+        (etag, last_modified) = validators
+        if self.get_content_encoding(request) is not None:
+            # a compressed body is not byte-identical, as in GZipMiddleware;
+            # a 304 must send the ETag that the 200 would
+            etag = 'W/' + etag
+        timestamp = None
+        if last_modified is not None:
+            timestamp = calendar.timegm(last_modified.utctimetuple())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
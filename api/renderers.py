@@ -0,0 +1,40 @@
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Render JSON with orjson when it is installed, with the same bytes as
+    the compact output of JSONRenderer. Indented output, and data that
+    orjson cannot encode, are rendered by JSONRenderer
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None \
+                or not api_settings.COMPACT_JSON \
+                or not api_settings.UNICODE_JSON:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        encoder = self.encoder_class()
+        try:
+            ret = orjson.dumps(
+                data,
+                default=encoder.default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME
+            )
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # escape the line separators that are invalid in JavaScript, as
+        # JSONRenderer does
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028') \
+            .replace(b'\xe2\x80\xa9', b'\\u2029')
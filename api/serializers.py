@@ -5,8 +5,11 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 
-from vocabulary.models import Word, Chapter, WordProperties, LearningData
-from vocabulary.helpers.helpers_fr_fi import save_chapter
+from vocabulary.models import Word, Chapter, WordProperties, LearningData, \
+                              AnalysisJob
+from vocabulary.helpers.helpers_fr_fi import save_chapter, create_chapter, \
+    preview_word_properties
+from vocabulary.helpers.jobs import enqueue_analysis
 
 
 class ServiceUnavailable(APIException):
@@ -75,6 +78,12 @@ class LearningDataSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'word', 'learned')
 
 
+class LearningDataStateSerializer(serializers.Serializer):
+    """Validate one learned state of a bulk learning data update"""
+    word = serializers.IntegerField()
+    learned = serializers.BooleanField()
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for user objects"""
     class Meta:
@@ -92,17 +101,18 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class UserDetailSerializer(UserSerializer):
-    """Serialize a user detail"""
-    learningdata = LearningDataForUserSerializer(
-      source='learningdata_set',
-      many=True
-    )
+    """Serialize a user detail with learning data counts. The queryset
+    must be annotated with `learningdata_count` and `learned_count`"""
+    learningdata_count = serializers.IntegerField(read_only=True)
+    learned_count = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = User
         fields = (
             'id',
             'username',
-            'learningdata'
+            'learningdata_count',
+            'learned_count'
         )
         read_only_fields = ('id',)
 
@@ -127,6 +137,35 @@ class WordSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class ValuesSerializer:
+    """
+    Read-only serializer of QuerySet.values() rows. `fields` pairs each
+    output name with the lookup it is read from, so rows are copied
+    without per-field serializer objects. Subclasses must produce the
+    same data as the serializer they stand in for
+    """
+    fields = ()
+
+    @classmethod
+    def lookups(cls):
+        """Return the lookups to pass to QuerySet.values()"""
+        return [lookup for (name, lookup) in cls.fields]
+
+    @classmethod
+    def serialize(cls, rows):
+        """Return the serialized data of an iterable of rows"""
+        fields = cls.fields
+        return [
+            {name: row[lookup] for (name, lookup) in fields}
+            for row in rows
+        ]
+
+
+class WordValuesSerializer(ValuesSerializer):
+    """Serialize word rows like WordSerializer"""
+    fields = tuple((name, name) for name in WordSerializer.Meta.fields)
+
+
 class WordPropertiesSerializer(serializers.ModelSerializer):
     """Serialize word properties"""
     word_id = serializers.ReadOnlyField(source='word.id')
@@ -152,6 +191,47 @@ class WordPropertiesSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class WordPropertiesValuesSerializer(ValuesSerializer):
+    """Serialize word properties rows like WordPropertiesSerializer"""
+    fields = (
+        ('id', 'id'),
+        ('word_id', 'word_id'),
+        ('lemma', 'word__lemma'),
+        ('translation', 'word__translation'),
+        ('pos', 'word__pos'),
+        ('gender', 'word__gender'),
+        ('pronunciation', 'word__pronunciation'),
+        ('token', 'token'),
+        ('frequency', 'frequency')
+    )
+
+
+class WordFrequencySerializer(serializers.Serializer):
+    """Serialize word properties aggregated per word over chapters"""
+    word_id = serializers.IntegerField(source='word')
+    lemma = serializers.CharField(source='word__lemma')
+    translation = serializers.CharField(source='word__translation')
+    pos = serializers.CharField(source='word__pos')
+    gender = serializers.CharField(source='word__gender')
+    pronunciation = serializers.CharField(source='word__pronunciation')
+    frequency = serializers.IntegerField()
+    chapters = serializers.IntegerField()
+
+
+class WordFrequencyValuesSerializer(ValuesSerializer):
+    """Serialize aggregated word rows like WordFrequencySerializer"""
+    fields = (
+        ('word_id', 'word'),
+        ('lemma', 'word__lemma'),
+        ('translation', 'word__translation'),
+        ('pos', 'word__pos'),
+        ('gender', 'word__gender'),
+        ('pronunciation', 'word__pronunciation'),
+        ('frequency', 'frequency'),
+        ('chapters', 'chapters')
+    )
+
+
 class WordPropertiesCreateSerializer(serializers.ModelSerializer):
     """Serialize word properties creation"""
     class Meta:
@@ -203,6 +283,28 @@ class ChapterSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_date', 'modified_date')
 
 
+class ChapterListSerializer(serializers.ModelSerializer):
+    """Serialize a chapter in the chapter list, with a summary instead of
+    the body. The queryset must be annotated with `body_summary`"""
+    summary = serializers.ReadOnlyField(source='body_summary')
+
+    class Meta:
+        model = Chapter
+        fields = (
+            'id',
+            'title',
+            'summary',
+            'created_date',
+            'created_by',
+            'modified_date',
+            'modified_by',
+            'public',
+            'source_lang',
+            'target_lang'
+        )
+        read_only_fields = fields
+
+
 class ChapterCreateSerializer(serializers.ModelSerializer):
     """Serialize chapter creation"""
     class Meta:
@@ -217,13 +319,29 @@ class ChapterCreateSerializer(serializers.ModelSerializer):
         )
 
     def create(self, validated_data):
-        """Create and return a new Chapter instance given the validated data"""
+        """Create and return a new Chapter instance given the validated data
+
+        With `async` in the serializer context the chapter is saved and its
+        analysis is queued; the queued job is available as `self.job`.
+        """
         title = validated_data.pop('title')
         body = validated_data.pop('body')
         source_lang = validated_data.pop('source_lang')
         target_lang = validated_data.pop('target_lang')
         created_by = validated_data.pop('created_by')
         public = validated_data.pop('public')
+        if self.context.get('async'):
+            chapter = create_chapter(
+                body,
+                source_lang,
+                target_lang,
+                title,
+                public,
+                created_by
+            )
+            self.job = enqueue_analysis(chapter)
+            return chapter
+
         (chapter, analyzed) = save_chapter(
             body,
             source_lang,
@@ -237,6 +355,67 @@ class ChapterCreateSerializer(serializers.ModelSerializer):
 
         return chapter
 
+
+class ChapterPreviewSerializer(serializers.ModelSerializer):
+    """Serialize a text whose vocabulary is previewed"""
+    class Meta:
+        model = Chapter
+        fields = (
+            'title',
+            'body',
+            'source_lang',
+            'target_lang'
+        )
+        extra_kwargs = {'title': {'required': False}}
+
+    def preview(self, fast=False):
+        """Return the unsaved word properties of the validated text"""
+        data = self.validated_data
+        wordproperties_list = preview_word_properties(
+            data.get('title', '') + ' ' + data['body'],
+            data['source_lang'],
+            data['target_lang'],
+            fast
+        )
+        if wordproperties_list is None:
+            raise ServiceUnavailable()
+
+        return wordproperties_list
+
+
+class WordPreviewSerializer(WordPropertiesSerializer):
+    """Serialize unsaved word properties of a preview"""
+    class Meta:
+        model = WordProperties
+        fields = (
+            'word_id',
+            'lemma',
+            'translation',
+            'pos',
+            'gender',
+            'pronunciation',
+            'token',
+            'frequency'
+        )
+        read_only_fields = fields
+
+
+class AnalysisJobSerializer(serializers.ModelSerializer):
+    """Serialize a chapter analysis job"""
+    class Meta:
+        model = AnalysisJob
+        fields = (
+            'id',
+            'chapter',
+            'status',
+            'error',
+            'created_date',
+            'started_date',
+            'finished_date'
+        )
+        read_only_fields = fields
+
+
 class ChapterDetailSerializer(ChapterSerializer):
     """Serialize a chapter detail"""
     words = WordPropertiesSerializer(
@@ -266,3 +445,17 @@ class ChapterDetailSerializer(ChapterSerializer):
             'modified_date',
             'words'
         )
+
+
+class ChapterDetailValuesSerializer(ChapterDetailSerializer):
+    """
+    Serialize a chapter detail like ChapterDetailSerializer, reading the
+    vocabulary as values() rows in one query
+    """
+    words = serializers.SerializerMethodField()
+
+    def get_words(self, chapter):
+        rows = chapter.wordproperties_set.values(
+            *WordPropertiesValuesSerializer.lookups()
+        )
+        return WordPropertiesValuesSerializer.serialize(rows)
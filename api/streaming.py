@@ -0,0 +1,120 @@
+import zlib
+from itertools import islice
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from api.renderers import FastJSONRenderer
+
+# number of rows fetched from the database cursor and encoded at a time
+STREAM_CHUNK_SIZE = 2000
+# compression levels that keep up with the database cursor
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def accepted_encodings(request):
+    """Return the content codings of Accept-Encoding with a nonzero q"""
+    accepted = set()
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for item in header.split(','):
+        (coding, _, params) = item.partition(';')
+        quality = 1.0
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def choose_encoding(request):
+    """Return 'br', 'gzip' or None for the client of a request"""
+    accepted = accepted_encodings(request)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def json_array(rows, values_serializer, chunk_size=STREAM_CHUNK_SIZE):
+    """Encode rows as one JSON array, chunk_size rows at a time
+
+    Parameters:
+    rows (iterable): QuerySet.values() rows
+    values_serializer (class): ValuesSerializer of the rows
+    chunk_size (int): number of rows per chunk
+
+    Returns:
+    generator: bytes of the array
+    """
+    renderer = FastJSONRenderer()
+    rows = iter(rows)
+    separator = b'['
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        encoded = renderer.render(values_serializer.serialize(chunk))
+        # drop the brackets of the chunk's own array
+        yield separator + encoded[1:-1]
+        separator = b','
+    yield b'[]' if separator == b'[' else b']'
+
+
+def compress(chunks, encoding):
+    """Compress a stream of bytes with gzip or brotli"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        (process, finish) = (compressor.process, compressor.finish)
+    else:
+        compressor = zlib.compressobj(
+            GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+        (process, finish) = (compressor.compress, compressor.flush)
+    for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def streaming_json_response(request, queryset, values_serializer):
+    """Stream a values() queryset as a JSON array
+
+    Rows are read through a database cursor in chunks, so memory use does
+    not depend on the number of rows. The body is compressed with brotli
+    or gzip when the client accepts it.
+
+    Parameters:
+    request (Request): request being answered
+    queryset (QuerySet): values() rows to stream
+    values_serializer (class): ValuesSerializer of the rows
+
+    Returns:
+    StreamingHttpResponse: the array as application/json
+    """
+    content = json_array(
+        queryset.iterator(chunk_size=STREAM_CHUNK_SIZE),
+        values_serializer
+    )
+    encoding = choose_encoding(request)
+    if encoding is not None:
+        content = compress(content, encoding)
+
+    response = StreamingHttpResponse(
+        content, content_type='application/json'
+    )
+    if encoding is not None:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -1,19 +1,29 @@
+import gzip
+import json
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
+from django.db.models.functions import Substr
 from django.test import TestCase
 from django.urls import reverse
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
-from vocabulary.models import Chapter, WordProperties
+from vocabulary.models import Chapter, WordProperties, AnalysisJob, \
+                              TextAnalysis, SUMMARY_LENGTH
+from vocabulary.helpers.dictionary import snapshots
+from vocabulary.tests.test_helpers import Token
 
-from api.serializers import ChapterSerializer, ChapterDetailSerializer, \
-                            WordPropertiesSerializer
+from api.serializers import ChapterListSerializer, \
+                            ChapterDetailSerializer, WordPropertiesSerializer
 from api.tests.test_word_api import create_word
 
 
 CHAPTERS_URL = reverse('api:chapter-list')
 WORDPROPERTIES_URL = reverse('api:wordproperties-list')
+PREVIEW_URL = reverse('api:chapter-preview')
 
 
 def detail_url(chapter_id):
@@ -21,6 +31,11 @@ def detail_url(chapter_id):
     return reverse('api:chapter-detail', args=[chapter_id])
 
 
+def job_url(job_id):
+    """Return analysis job detail URL"""
+    return reverse('api:job-detail', args=[job_id])
+
+
 def create_chapter(user, public=False, **params):
     """Create and return a test chapter"""
     defaults = {
@@ -33,6 +48,14 @@ def create_chapter(user, public=False, **params):
     return Chapter.objects.create(created_by=user, **defaults)
 
 
+def list_chapters(queryset):
+    """Return chapters as serialized in the chapter list"""
+    queryset = queryset.annotate(
+        body_summary=Substr('body', 1, SUMMARY_LENGTH)
+    )
+    return ChapterListSerializer(queryset, many=True).data
+
+
 def create_word_properties(word, chapter, **params):
     """Create and return test word properties"""
     defaults = {
@@ -59,9 +82,71 @@ class PublicChapterApiTests(TestCase):
         create_chapter(user=self.user, public=True)
         res = self.client.get(CHAPTERS_URL)
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_public_chapter_cached(self):
+        """Test that public chapters are served from the cache until
+        the chapter, its word properties or their words change"""
+        chapter = create_chapter(user=self.user, public=True)
+        word = create_word(user=self.user, lemma='beau', translation='kaunis')
+        wp = create_word_properties(word=word, chapter=chapter)
+
+        res = self.client.get(detail_url(chapter.id))
+        etag = res['ETag']
+        with self.assertNumQueries(0):
+            res = self.client.get(detail_url(chapter.id))
+        self.assertEqual(res.data['words'][0]['translation'], 'kaunis')
+        self.assertEqual(res['ETag'], etag)
+        with self.assertNumQueries(0):
+            res = self.client.get(
+                detail_url(chapter.id), HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        word.translation = 'komea'
+        word.save()
+        res = self.client.get(detail_url(chapter.id))
+        self.assertEqual(res.data['words'][0]['translation'], 'komea')
+
+        wp.frequency = 5
+        wp.save()
+        res = self.client.get(detail_url(chapter.id))
+        self.assertEqual(res.data['words'][0]['frequency'], 5)
+
+        self.client.delete(
+            reverse('api:wordproperties-detail', args=[wp.id])
+        )
+        res = self.client.get(detail_url(chapter.id))
+        self.assertEqual(res.data['words'], [])
+
+        chapter.title = 'Nouveau'
+        chapter.save()
+        res = self.client.get(detail_url(chapter.id))
+        self.assertEqual(res.data['title'], 'Nouveau')
+
+    def test_private_chapter_not_cached(self):
+        """Test that private chapters always come from the database"""
+        chapter = create_chapter(user=self.user)
+
+        self.client.get(detail_url(chapter.id))
+        with self.assertNumQueries(3):
+            self.client.get(detail_url(chapter.id))
+
+    def test_public_chapter_list_cached(self):
+        """Test that anonymous chapter list pages are cached"""
+        chapter = create_chapter(user=self.user, public=True)
+
+        self.client.get(CHAPTERS_URL)
+        with self.assertNumQueries(0):
+            res = self.client.get(CHAPTERS_URL)
+        self.assertEqual(len(res.data['results']), 1)
+
+        chapter.public = False
+        chapter.save()
+        res = self.client.get(CHAPTERS_URL)
+        self.assertEqual(res.data['results'], [])
+
 
 class PrivateChapterApiTests(TestCase):
     """Test authenticated chapter API access"""
@@ -82,9 +167,8 @@ class PrivateChapterApiTests(TestCase):
         res = self.client.get(CHAPTERS_URL)
 
         chapters = Chapter.objects.all().order_by('public', 'title')
-        serializer = ChapterSerializer(chapters, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], list_chapters(chapters))
 
     def test_chapters_limited_to_user(self):
         """Test retrieving chapters for user"""
@@ -98,10 +182,20 @@ class PrivateChapterApiTests(TestCase):
         res = self.client.get(CHAPTERS_URL)
 
         chapters = Chapter.objects.filter(created_by=self.user)
-        serializer = ChapterSerializer(chapters, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], list_chapters(chapters))
+
+    def test_chapter_list_summary(self):
+        """Test that the list has summaries instead of full bodies"""
+        chapter = create_chapter(user=self.user, body='Il fait beau. ' * 20)
+
+        res = self.client.get(CHAPTERS_URL, {'page_size': 1})
+
+        self.assertEqual(res.data['count'], 1)
+        result = res.data['results'][0]
+        self.assertNotIn('body', result)
+        self.assertEqual(result['summary'], chapter.summary())
 
     def test_view_chapter_detail(self):
         """Test viewing a chapter detail"""
@@ -116,9 +210,189 @@ class PrivateChapterApiTests(TestCase):
         url = detail_url(chapter.id)
         res = self.client.get(url)
 
+        chapter.refresh_from_db()
         serializer = ChapterDetailSerializer(chapter)
         self.assertEqual(res.data, serializer.data)
 
+    def test_chapter_detail_matches_serializer(self):
+        """Test that the fast read path renders what the serializer does"""
+        chapter = create_chapter(user=self.user, body='Il fait très beau.')
+        for (lemma, translation) in [('très', 'hyvin'), ('beau', 'kaunis')]:
+            word = create_word(
+                user=self.user, lemma=lemma, translation=translation
+            )
+            create_word_properties(
+                word=word, chapter=chapter, token=lemma + 'x', frequency=2
+            )
+
+        res = self.client.get(detail_url(chapter.id))
+
+        chapter = Chapter.objects.prefetch_related(
+            'wordproperties_set__word'
+        ).get(pk=chapter.pk)
+        expected = JSONRenderer().render(ChapterDetailSerializer(chapter).data)
+        self.assertEqual(res.content, expected)
+
+    def test_chapter_detail_not_modified(self):
+        """Test that a matching ETag returns 304 after one query"""
+        chapter = create_chapter(user=self.user)
+        word = create_word(user=self.user, lemma='beau')
+        wp = create_word_properties(word=word, chapter=chapter)
+
+        res = self.client.get(detail_url(chapter.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etag = res['ETag']
+        self.assertIn('Last-Modified', res)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                detail_url(chapter.id), HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+        wp.frequency = 2
+        wp.save()
+        res = self.client.get(detail_url(chapter.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        etag = res['ETag']
+
+        word.translation = 'kaunis'
+        word.save()
+        res = self.client.get(detail_url(chapter.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etag = res['ETag']
+
+        wp.delete()
+        res = self.client.get(detail_url(chapter.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['words'], [])
+
+    def test_chapter_detail_query_count(self):
+        """Test that the vocabulary size does not change the query count"""
+        small = create_chapter(user=self.user)
+        large = create_chapter(user=self.user)
+        for i in range(30):
+            word = create_word(user=self.user, lemma='mot%d' % i)
+            create_word_properties(word=word, chapter=large)
+            if i < 2:
+                create_word_properties(word=word, chapter=small)
+
+        # the validators, the chapter, then its word properties joined to
+        # their words
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(small.id))
+        self.assertEqual(len(res.data['words']), 2)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(large.id))
+        self.assertEqual(len(res.data['words']), 30)
+        large.refresh_from_db()
+        self.assertEqual(
+            res.data, ChapterDetailSerializer(large).data
+        )
+
+    def test_create_chapter_async(self):
+        """Test that async creation saves the chapter and queues analysis"""
+        payload = {
+            'title': 'Chapitre',
+            'body': 'Il fait beau.',
+            'source_lang': 'fr',
+            'target_lang': 'fi',
+            'created_by': self.user.id,
+            'public': False
+        }
+        res = self.client.post(CHAPTERS_URL + '?async=true', payload)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        job = AnalysisJob.objects.get(id=res.data['id'])
+        self.assertEqual(job.status, AnalysisJob.QUEUED)
+        self.assertEqual(job.chapter.title, payload['title'])
+        self.assertEqual(res.data['chapter'], job.chapter.id)
+        self.assertFalse(job.chapter.wordproperties_set.exists())
+
+    def test_view_job_status(self):
+        """Test retrieving the status of an analysis job"""
+        chapter = create_chapter(user=self.user)
+        job = AnalysisJob.objects.create(chapter=chapter)
+
+        res = self.client.get(job_url(job.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], AnalysisJob.QUEUED)
+
+    def test_job_status_limited_to_user(self):
+        """Test that jobs of other users' chapters are not visible"""
+        user2 = get_user_model().objects.create_user(
+            'other',
+            'password123'
+        )
+        chapter = create_chapter(user=user2)
+        job = AnalysisJob.objects.create(chapter=chapter)
+
+        res = self.client.get(job_url(job.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch('vocabulary.helpers.helpers_fr_fi.registry')
+    def test_preview_fast(self, registry):
+        """Test previewing a text with the fast analysis saves nothing"""
+        class Pipeline:
+            def make_doc(self, text):
+                return [
+                    Token(w, w.isalpha(), '', w.lower()) for w in text.split()
+                ]
+
+        registry.packages = {'fr': 'fr_test_model'}
+        registry.get.return_value = Pipeline()
+        snapshots.clear()
+        create_word(user=self.user, lemma='beau', translation='kaunis')
+        payload = {
+            'body': 'Il fait beau',
+            'source_lang': 'fr',
+            'target_lang': 'fi'
+        }
+
+        res = self.client.post(PREVIEW_URL + '?mode=fast', payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['mode'], 'fast')
+        self.assertEqual(len(res.data['words']), 1)
+        self.assertEqual(res.data['words'][0]['lemma'], 'beau')
+        self.assertEqual(res.data['words'][0]['frequency'], 1)
+        self.assertFalse(Chapter.objects.exists())
+
+    def test_preview_invalid_mode(self):
+        """Test that an unknown preview mode is rejected"""
+        payload = {
+            'body': 'Il fait beau',
+            'source_lang': 'fr',
+            'target_lang': 'fi'
+        }
+
+        res = self.client.post(PREVIEW_URL + '?mode=quick', payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch('vocabulary.helpers.helpers_fr_fi.spacy_analyze')
+    def test_preview_accurate(self, spacy_analyze):
+        """Test that an accurate preview stores no analysis"""
+        spacy_analyze.return_value = [Token('beau', True, 'NOUN', 'beau')]
+        snapshots.clear()
+        create_word(user=self.user, lemma='beau', translation='kaunis')
+        payload = {
+            'body': 'beau',
+            'source_lang': 'fr',
+            'target_lang': 'fi'
+        }
+
+        res = self.client.post(PREVIEW_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['words'][0]['frequency'], 1)
+        self.assertFalse(TextAnalysis.objects.exists())
+
 
 class PublicWordPropertiesApiTests(TestCase):
     """Test the publicly available wordproperties API"""
@@ -158,7 +432,7 @@ class PrivateWordPropertiesAPITests(TestCase):
         wordproperties = WordProperties.objects.all().order_by('-id')
         serializer = WordPropertiesSerializer(wordproperties, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_wordproperties_limited_to_user(self):
         """Test that word properties for the authenticated user are returned"""
@@ -173,5 +447,96 @@ class PrivateWordPropertiesAPITests(TestCase):
         res = self.client.get(WORDPROPERTIES_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['lemma'], wp.word.lemma)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['lemma'], wp.word.lemma)
+
+    def test_filter_wordproperties_invalid_chapter(self):
+        """Test that a chapter filter that is not an id is rejected"""
+        res = self.client.get(WORDPROPERTIES_URL, {'chapter': 'abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_wordproperties(self):
+        """Test filtering word properties by chapter and language"""
+        chapter2 = create_chapter(
+            user=self.user, source_lang='it', target_lang='fi'
+        )
+        create_word_properties(word=self.word1, chapter=self.chapter)
+        wp = create_word_properties(word=self.word2, chapter=chapter2)
+
+        res = self.client.get(WORDPROPERTIES_URL, {'chapter': chapter2.id})
+        self.assertEqual(
+            [r['id'] for r in res.data['results']], [wp.id]
+        )
+
+        res = self.client.get(WORDPROPERTIES_URL, {'source': 'it'})
+        self.assertEqual(
+            [r['id'] for r in res.data['results']], [wp.id]
+        )
+
+    def test_wordproperties_query_count(self):
+        """Test that words are joined instead of loaded per row"""
+        for i in range(10):
+            word = create_word(user=self.user, lemma='mot%d' % i)
+            create_word_properties(word=word, chapter=self.chapter)
+
+        # the count and one page joined to words
+        with self.assertNumQueries(2):
+            res = self.client.get(WORDPROPERTIES_URL)
+        self.assertEqual(len(res.data['results']), 10)
+
+    def test_stream_wordproperties(self):
+        """Test streaming all word properties as one gzipped JSON array"""
+        for i in range(5):
+            word = create_word(user=self.user, lemma='mot%d' % i)
+            create_word_properties(word=word, chapter=self.chapter)
+
+        res = self.client.get(
+            WORDPROPERTIES_URL,
+            {'stream': 'true'},
+            HTTP_ACCEPT_ENCODING='gzip, br;q=0'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        content = gzip.decompress(b''.join(res.streaming_content))
+        wordproperties = WordProperties.objects.all().order_by('-id')
+        serializer = WordPropertiesSerializer(wordproperties, many=True)
+        self.assertEqual(json.loads(content.decode()), serializer.data)
+
+    def test_stream_distinct_words(self):
+        """Test streaming aggregated words without compression"""
+        chapter2 = create_chapter(user=self.user)
+        create_word_properties(word=self.word1, chapter=self.chapter)
+        create_word_properties(word=self.word1, chapter=chapter2)
+
+        res = self.client.get(
+            WORDPROPERTIES_URL, {'stream': 'true', 'distinct': 'true'}
+        )
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        data = json.loads(b''.join(res.streaming_content).decode())
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['word_id'], self.word1.id)
+        self.assertEqual(data[0]['chapters'], 2)
+
+    def test_distinct_words(self):
+        """Test aggregating word frequencies over chapters"""
+        chapter2 = create_chapter(user=self.user)
+        create_word_properties(
+            word=self.word1, chapter=self.chapter, frequency=2
+        )
+        create_word_properties(word=self.word1, chapter=chapter2, frequency=3)
+        create_word_properties(word=self.word2, chapter=chapter2)
+
+        res = self.client.get(WORDPROPERTIES_URL, {'distinct': 'true'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 2)
+        self.assertEqual(
+            [(r['lemma'], r['frequency'], r['chapters'])
+             for r in res.data['results']],
+            [('faire', 1, 1), ('il', 5, 2)]
+        )
+        self.assertEqual(res.data['results'][1]['word_id'], self.word1.id)
@@ -5,8 +5,23 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from vocabulary.models import LearningData
+
+from api.tests.test_word_api import create_word
+
 
 TOKEN_URL = reverse('api:token')
+LEARNINGDATA_BULK_URL = reverse('api:learningdata-bulk')
+
+
+def detail_url(user_id):
+    """Return user detail URL"""
+    return reverse('api:user-detail', args=[user_id])
+
+
+def learningdata_url(user_id):
+    """Return the learning data URL of a user"""
+    return reverse('api:user-learningdata', args=[user_id])
 
 def create_user(**params):
     return get_user_model().objects.create_user(**params)
@@ -48,3 +63,109 @@ class PublicUserApiTests(TestCase):
         res = self.client.post(TOKEN_URL, {'username': 'one', 'password': ''})
         self.assertNotIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PrivateUserApiTests(TestCase):
+    """Test the users API (authenticated)"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(username='test', password='testpass')
+        self.client.force_authenticate(self.user)
+
+    def learn(self, count, learned=False, **params):
+        for i in range(count):
+            word = create_word(
+                user=self.user,
+                lemma='mot%d%s' % (i, params.get('target_lang', '')),
+                **params
+            )
+            LearningData.objects.create(
+                user=self.user, word=word, learned=learned
+            )
+
+    def test_retrieve_user_counts(self):
+        """Test that the user detail has learning data counts only"""
+        self.learn(3)
+        self.learn(2, learned=True, target_lang='en')
+
+        res = self.client.get(detail_url(self.user.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'id': self.user.id,
+            'username': 'test',
+            'learningdata_count': 5,
+            'learned_count': 2
+        })
+
+    def test_list_learningdata(self):
+        """Test paging and filtering the learning data of a user"""
+        self.learn(3)
+        self.learn(2, learned=True, target_lang='en')
+
+        res = self.client.get(
+            learningdata_url(self.user.id), {'page_size': 2}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 5)
+        self.assertEqual(len(res.data['results']), 2)
+
+        res = self.client.get(
+            learningdata_url(self.user.id),
+            {'source': 'fr', 'target': 'en', 'learned': 'true'}
+        )
+        self.assertEqual(res.data['count'], 2)
+        self.assertTrue(all(ld['learned'] for ld in res.data['results']))
+        self.assertEqual(res.data['results'][0]['target_lang'], 'en')
+
+    def test_list_learningdata_query_count(self):
+        """Test that words are loaded in a constant number of queries"""
+        self.learn(3)
+        # the user, the count and one page of learning data with words
+        with self.assertNumQueries(3):
+            self.client.get(learningdata_url(self.user.id))
+
+        self.learn(20, target_lang='en')
+        with self.assertNumQueries(3):
+            res = self.client.get(learningdata_url(self.user.id))
+        self.assertEqual(len(res.data['results']), 23)
+
+    def test_bulk_learningdata(self):
+        """Test creating and updating learned states in one request"""
+        word1 = create_word(user=self.user, lemma='chat')
+        word2 = create_word(user=self.user, lemma='chien')
+        other = create_user(username='other', password='testpass')
+        LearningData.objects.create(user=self.user, word=word1)
+        LearningData.objects.create(user=other, word=word1)
+        payload = [
+            {'word': word1.id, 'learned': True},
+            {'word': word2.id, 'learned': True},
+            {'word': word2.id, 'learned': False},
+        ]
+
+        res = self.client.post(LEARNINGDATA_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted((ld['word'], ld['learned']) for ld in res.data),
+            [(word1.id, True), (word2.id, False)]
+        )
+        self.assertTrue(all(ld['user'] == self.user.id for ld in res.data))
+        self.assertEqual(
+            LearningData.objects.filter(user=self.user).count(), 2
+        )
+        self.assertFalse(LearningData.objects.get(user=other).learned)
+
+    def test_bulk_learningdata_invalid_word(self):
+        """Test that unknown words are rejected without writing"""
+        word = create_word(user=self.user, lemma='chat')
+        payload = [
+            {'word': word.id, 'learned': True},
+            {'word': word.id + 100, 'learned': True},
+        ]
+
+        res = self.client.post(LEARNINGDATA_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(LearningData.objects.exists())
@@ -1,16 +1,28 @@
+import json
+from collections import OrderedDict
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
 from django.urls import reverse
 from django.test import TestCase
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
 from vocabulary.models import Word
+from vocabulary.helpers.dictionary import snapshots
 
 from api.serializers import WordSerializer
 
 
 WORDS_URL = reverse('api:word-list')
+AUTOCOMPLETE_URL = reverse('api:word-autocomplete')
+EXPORT_URL = reverse('api:word-export-words')
+IMPORT_URL = reverse('api:word-import-words')
+BATCH_URL = reverse('api:word-batch')
 SOURCE = 'fr'
 TARGET = 'fi'
 
@@ -63,6 +75,205 @@ class PublicWordApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data['results'], serializer.data)
 
+    def test_word_list_matches_serializer(self):
+        """Test that the fast list path renders what the serializer does"""
+        create_word(
+            user=self.user, lemma='table', translation='pöytä', gender='f'
+        )
+        create_word(
+            user=self.user2, lemma='dormir', translation='nuk\u2028kua',
+            pos='VERB', gender=None
+        )
+
+        res = self.client.get(WORDS_URL)
+
+        expected = JSONRenderer().render(OrderedDict([
+            ('count', 2),
+            ('next', None),
+            ('previous', None),
+            ('results', WordSerializer(Word.objects.all(), many=True).data)
+        ]))
+        self.assertEqual(res.content, expected)
+
+    def test_stream_words(self):
+        """Test streaming all filtered words as one JSON array"""
+        for lemma in ['b', 'a', 'c']:
+            create_word(user=self.user, lemma=lemma)
+        create_word(user=self.user, lemma='d', source_lang='it')
+
+        res = self.client.get(WORDS_URL, {'stream': 'true', 'source': SOURCE})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        data = json.loads(b''.join(res.streaming_content).decode())
+        words = Word.objects.filter(source_lang=SOURCE)
+        self.assertEqual(data, WordSerializer(words, many=True).data)
+
+        res = self.client.get(WORDS_URL, {'stream': 'true', 'source': 'en'})
+        self.assertEqual(b''.join(res.streaming_content), b'[]')
+
+    def test_word_list_not_modified(self):
+        """Test that the word list answers If-None-Match with 304"""
+        word = create_word(user=self.user, lemma='petit')
+
+        res = self.client.get(WORDS_URL, {'source': SOURCE})
+        etag = res['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                WORDS_URL, {'source': SOURCE}, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.client.get(
+            WORDS_URL, {'source': SOURCE, 'page': 1}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        word.translation = 'pikku'
+        word.save()
+        res = self.client.get(
+            WORDS_URL, {'source': SOURCE}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_compressed_word_list_weak_etag(self):
+        """Test that a compressed list and its 304 send the same weak ETag"""
+        create_word(user=self.user, lemma='petit')
+        params = {'source': SOURCE, 'stream': 'true'}
+
+        res = self.client.get(WORDS_URL, params, HTTP_ACCEPT_ENCODING='gzip')
+        etag = res['ETag']
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertTrue(etag.startswith('W/'))
+
+        res = self.client.get(
+            WORDS_URL, params,
+            HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_word_detail_not_modified(self):
+        """Test that a word detail answers If-None-Match with 304"""
+        word = create_word(user=self.user, lemma='petit')
+        url = reverse('api:word-detail', args=[word.id])
+
+        res = self.client.get(url)
+        self.assertIn('Last-Modified', res)
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.client.get(reverse('api:word-detail', args=[word.id + 1]))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_filter_words_startswith(self):
+        """Test that prefix search ignores case"""
+        create_word(
+            user=self.user, lemma='Paris', translation='Pariisi', pos='PROPN'
+        )
+        create_word(
+            user=self.user, lemma='petit', translation='pieni', pos='ADJ'
+        )
+        create_word(
+            user=self.user, lemma='table', translation='pöytä', pos='NOUN'
+        )
+
+        res = self.client.get(WORDS_URL, {'startswith': 'P'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [w['lemma'] for w in res.data['results']],
+            ['Paris', 'petit']
+        )
+
+    def test_autocomplete(self):
+        """Test completing lemmas of one language pair"""
+        snapshots.clear()
+        create_word(
+            user=self.user, lemma='petit', translation='pieni', pos='ADJ'
+        )
+        create_word(
+            user=self.user, lemma='Pas', translation='askel', pos='NOUN'
+        )
+        create_word(
+            user=self.user, lemma='pomme', translation='apple', pos='NOUN',
+            target_lang='en'
+        )
+
+        res = self.client.get(
+            AUTOCOMPLETE_URL,
+            {'q': 'p', 'source': SOURCE, 'target': TARGET, 'limit': 5}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(w['lemma'], w['translation']) for w in res.data],
+            [('Pas', 'askel'), ('petit', 'pieni')]
+        )
+
+    def test_cursor_pagination(self):
+        """Test paging through words with keyset cursors"""
+        for lemma in ['d', 'B', 'a', 'c', 'e']:
+            create_word(user=self.user, lemma=lemma)
+
+        res = self.client.get(
+            WORDS_URL, {'pagination': 'cursor', 'page_size': 2}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertEqual([w['lemma'] for w in res.data['results']], ['a', 'B'])
+
+        # a word inserted before the cursor does not shift the next page
+        create_word(user=self.user, lemma='aa')
+        with self.assertNumQueries(1):
+            res = self.client.get(res.data['next'])
+        self.assertEqual([w['lemma'] for w in res.data['results']], ['c', 'd'])
+
+        res = self.client.get(res.data['next'])
+        self.assertEqual([w['lemma'] for w in res.data['results']], ['e'])
+        self.assertIsNone(res.data['next'])
+
+    def test_cursor_pagination_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        res = self.client.get(
+            WORDS_URL, {'pagination': 'cursor', 'cursor': 'garbage'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_export_words(self):
+        """Test streaming the dictionary as JSON lines"""
+        create_word(user=self.user, lemma='petit', translation='pieni')
+        create_word(
+            user=self.user, lemma='small', translation='pieni',
+            source_lang='en'
+        )
+
+        res = self.client.get(EXPORT_URL, {'type': 'jsonl', 'source': 'fr'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn('"lemma": "petit"', lines[0])
+
+    def test_import_words_requires_login(self):
+        """Test that importing words needs authentication"""
+        res = self.client.post(IMPORT_URL, {})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_autocomplete_requires_languages(self):
+        """Test that autocomplete needs a language pair"""
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'p'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(
+            AUTOCOMPLETE_URL, {'q': 'p', 'source': 'xx', 'target': TARGET}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class PrivateWordApiTests(TestCase):
     """Test the authorized user word API"""
@@ -117,6 +328,108 @@ class PrivateWordApiTests(TestCase):
         ).exists()
         self.assertTrue(exists)
 
+    def test_import_words(self):
+        """Test uploading words as CSV"""
+        create_word(user=self.user, lemma='petit', translation='pien')
+        upload = SimpleUploadedFile(
+            'words.csv',
+            'lemma,translation,pos,gender,pronunciation,source_lang,'
+            'target_lang\n'
+            'petit,pieni,NOUN,m,,fr,fi\n'
+            'chaise,tuoli,NOUN,f,,fr,fi\n'
+            'chaise,tuoli,NOUN,f,,fr,fi\n'.encode()
+        )
+
+        res = self.client.post(IMPORT_URL, {'file': upload})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data, {'inserted': 1, 'updated': 1, 'skipped': 1}
+        )
+        self.assertEqual(Word.objects.get(lemma='petit').translation, 'pieni')
+
+    def test_import_words_not_utf8(self):
+        """Test that a file in another encoding is rejected"""
+        upload = SimpleUploadedFile(
+            'words.csv',
+            'lemma,translation,pos,gender,pronunciation,source_lang,'
+            'target_lang\n'
+            'bébé,vauva,NOUN,m,,fr,fi\n'.encode('latin-1')
+        )
+
+        res = self.client.post(IMPORT_URL, {'file': upload})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file', res.data)
+
+    def test_batch_create_and_update(self):
+        """Test creating and updating words in one request"""
+        word = create_word(user=self.user, lemma='petit', translation='pien')
+        payload = [
+            {'id': word.id, 'translation': 'pieni'},
+            {'lemma': 'Chaise', 'translation': 'tuoli', 'pos': 'NOUN',
+             'gender': 'f', 'source_lang': SOURCE, 'target_lang': TARGET},
+        ]
+
+        with self.assertNumQueries(9):
+            # the words to update, one uniqueness check per item, then one
+            # transaction with a bulk insert and a bulk update, the ids of
+            # the created words and the public chapters using the updated
+            # words
+            res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['status'] for r in res.data], ['updated', 'created']
+        )
+        word.refresh_from_db()
+        self.assertEqual(word.translation, 'pieni')
+        self.assertEqual(word.modified_by, self.user)
+        chaise = Word.objects.get(lemma='Chaise')
+        self.assertEqual(res.data[1]['word']['id'], chaise.id)
+        self.assertEqual(chaise.normalized_lemma, 'chaise')
+        self.assertEqual(chaise.created_by, self.user)
+
+    def test_batch_invalid_item(self):
+        """Test that one invalid item prevents writing the batch"""
+        payload = [
+            {'lemma': 'chaise', 'translation': 'tuoli', 'pos': 'NOUN',
+             'gender': 'f', 'source_lang': SOURCE, 'target_lang': TARGET},
+            {'lemma': ''},
+            {'id': 12345, 'translation': 'x'},
+        ]
+
+        res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [r['status'] for r in res.data], ['valid', 'error', 'error']
+        )
+        self.assertIn('lemma', res.data[1]['errors'])
+        self.assertFalse(Word.objects.exists())
+
+    def test_batch_duplicate_items(self):
+        """Test that the same new word twice in a batch is rejected"""
+        item = {'lemma': 'chaise', 'translation': 'tuoli', 'pos': 'NOUN',
+                'gender': 'f', 'source_lang': SOURCE, 'target_lang': TARGET}
+
+        res = self.client.post(BATCH_URL, [item, item], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[1]['status'], 'error')
+
+    def test_batch_conflict(self):
+        """Test that a batch clashing with the database answers 409"""
+        item = {'lemma': 'chaise', 'translation': 'tuoli', 'pos': 'NOUN',
+                'gender': 'f', 'source_lang': SOURCE, 'target_lang': TARGET}
+
+        with patch.object(Word.objects, 'bulk_create',
+                          side_effect=IntegrityError):
+            res = self.client.post(BATCH_URL, [item], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Word.objects.exists())
+
     def test_create_word_invalid(self):
         """Test creating invalid word fails"""
         payload = {'lemma': ''}
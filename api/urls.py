@@ -17,11 +17,21 @@ urlpatterns = [
     path('token/', views.CustomObtainAuthToken.as_view(), name='token'),
     path('register/', views.RegisterUserView.as_view(), name='register'),
     path('chapters/', views.ChapterListView.as_view(), name='chapter-list'),
+    path(
+        'chapters/preview',
+        views.ChapterPreviewView.as_view(),
+        name='chapter-preview'
+    ),
     path(
         'chapters/<int:pk>',
         views.ChapterDetailView.as_view(),
         name='chapter-detail'
     ),
+    path(
+        'jobs/<int:pk>',
+        views.AnalysisJobDetailView.as_view(),
+        name='job-detail'
+    ),
     path(
         'wordproperties/',
         views.WordPropertiesListView.as_view(),
@@ -1,19 +1,70 @@
+import base64
+import binascii
+import io
+import json
+from collections import OrderedDict
+
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework import viewsets, mixins, generics, permissions
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.renderers import JSONRenderer
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from django.contrib.auth.models import User
-from django.db.models import Q
-from django.http import Http404
+from django.db import transaction
+from django.db.models import Q, Count, Max, Prefetch, Sum
+from django.db.models.functions import Substr
+from django.http import Http404, StreamingHttpResponse
+
+from vocabulary.models import Word, Chapter, WordProperties, LearningData, \
+                              AnalysisJob, normalize_lemma, SUMMARY_LENGTH
 
-from vocabulary.models import Word, Chapter, WordProperties, LearningData
+from vocabulary.helpers.dictionary import snapshots
+from vocabulary.helpers import word_io, word_batch, chapter_cache
+from vocabulary.helpers.learning import upsert_learning_data
+from vocabulary.helpers.reanalysis import analyze_edit, apply_edit
 
 from api import serializers
+from api.conditional import ConditionalGetMixin, make_etag
+from api.renderers import FastJSONRenderer
+from api.streaming import streaming_json_response, choose_encoding
+
+
+# renderers of the large read endpoints: FastJSONRenderer replaces
+# JSONRenderer, the browsable API stays available
+FAST_RENDERER_CLASSES = [FastJSONRenderer] + [
+    renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+    if not issubclass(renderer, JSONRenderer)
+]
+
+
+def vocabulary_prefetch():
+    """
+    Prefetch the word properties of chapters joined to their words, with
+    only the columns that WordPropertiesSerializer reads
+    """
+    return Prefetch(
+        'wordproperties_set',
+        queryset=WordProperties.objects.select_related('word').only(
+            'id',
+            'chapter',
+            'token',
+            'frequency',
+            'word__id',
+            'word__lemma',
+            'word__translation',
+            'word__pos',
+            'word__gender',
+            'word__pronunciation'
+        )
+    )
 
 
 class LargeResultsSetPagination(PageNumberPagination):
@@ -21,6 +72,91 @@ class LargeResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
 
 
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class WordKeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination over (normalized_lemma, id).
+    Each page is one indexed range query, with no OFFSET and no COUNT,
+    and rows inserted behind the cursor do not shift later pages.
+    The queryset yields values() rows that include both keys
+    """
+    page_size = 1000
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by('normalized_lemma', 'id')
+        if position is not None:
+            (lemma, pk) = position
+            queryset = queryset.filter(
+                Q(normalized_lemma__gt=lemma) |
+                Q(normalized_lemma=lemma, id__gt=pk)
+            )
+
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        results = results[:page_size]
+        if self.has_next:
+            self.next_position = (
+                results[-1]['normalized_lemma'], results[-1]['id']
+            )
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """Return the (normalized_lemma, id) position of the cursor"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            (lemma, pk) = json.loads(
+                base64.urlsafe_b64decode(encoded.encode('ascii')).decode()
+            )
+            return (str(lemma), int(pk))
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(position).encode()
+        ).decode('ascii')
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            encoded
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+
 class CustomObtainAuthToken(ObtainAuthToken):
     def post(self, request, *args, **kwargs):
         response = super(CustomObtainAuthToken, self).post(request, *args, **kwargs)
@@ -46,6 +182,18 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = serializers.UserSerializer
 
+    def get_queryset(self):
+        """Annotate users with learning data counts for the detail view"""
+        if self.action == 'retrieve':
+            return self.queryset.annotate(
+                learningdata_count=Count('learningdata'),
+                learned_count=Count(
+                    'learningdata', filter=Q(learningdata__learned=True)
+                )
+            )
+
+        return self.queryset
+
     def get_serializer_class(self):
         """Return appropriate serializer class"""
         if self.action == 'retrieve':
@@ -53,14 +201,60 @@ class UserViewSet(viewsets.ModelViewSet):
 
         return self.serializer_class
 
+    @action(detail=True)
+    def learningdata(self, request, pk=None):
+        """
+        List the learning data of a user with word details, one page at a
+        time. Optionally filtered by the `source` and `target` languages
+        of the words and by `learned` (true or false)
+        """
+        user = self.get_object()
+        source = request.query_params.get('source', None)
+        target = request.query_params.get('target', None)
+        learned = request.query_params.get('learned', None)
+
+        queryset = LearningData.objects.filter(user=user) \
+            .select_related('word').only(
+                'id',
+                'learned',
+                'word__id',
+                'word__lemma',
+                'word__translation',
+                'word__pos',
+                'word__gender',
+                'word__pronunciation',
+                'word__source_lang',
+                'word__target_lang'
+            )
+        if source is not None:
+            queryset = queryset.filter(word__source_lang=source)
+        if target is not None:
+            queryset = queryset.filter(word__target_lang=target)
+        if learned is not None:
+            queryset = queryset.filter(
+                learned=learned.lower() in ('1', 'true')
+            )
+
+        paginator = StandardResultsSetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = serializers.LearningDataForUserSerializer(
+            page, many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
 
-class WordViewSet(viewsets.ModelViewSet):
+
+class WordViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Manage words in the database"""
+    autocomplete_limit = 10
+    autocomplete_max_limit = 50
+    batch_max_size = 5000
+
     authentication_classes = (TokenAuthentication,)
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     queryset = Word.objects.all()
     serializer_class = serializers.WordSerializer
     pagination_class = LargeResultsSetPagination
+    renderer_classes = FAST_RENDERER_CLASSES
 
     def get_queryset(self):
         """
@@ -72,7 +266,9 @@ class WordViewSet(viewsets.ModelViewSet):
         source = self.request.query_params.get('source', None)
         target = self.request.query_params.get('target', None)
         if startswith is not None:
-            self.queryset = self.queryset.filter(lemma__istartswith=startswith)
+            self.queryset = self.queryset.filter(
+                normalized_lemma__startswith=normalize_lemma(startswith)
+            )
         if source is not None:
             self.queryset = self.queryset.filter(source_lang=source)
         if target is not None:
@@ -83,6 +279,226 @@ class WordViewSet(viewsets.ModelViewSet):
         """Create a new word object"""
         serializer.save(created_by=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, self.list_values, *args, **kwargs
+        )
+
+    def get_content_encoding(self, request):
+        """Streamed lists are compressed, see streaming_json_response"""
+        if self.action == 'list' and request.query_params.get(
+                'stream', '').lower() in ('1', 'true'):
+            return choose_encoding(request)
+        return None
+
+    def list_values(self, request, *args, **kwargs):
+        """
+        List words from values() rows, serialized like WordSerializer
+        without building model instances. With `stream=true` all the
+        filtered words are streamed as one JSON array instead of a page
+        """
+        if request.query_params.get('stream', '').lower() in ('1', 'true'):
+            return streaming_json_response(
+                request,
+                self.filter_queryset(self.get_queryset()).values(
+                    *serializers.WordValuesSerializer.lookups()
+                ),
+                serializers.WordValuesSerializer
+            )
+
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *serializers.WordValuesSerializer.lookups(),
+            'normalized_lemma'
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                serializers.WordValuesSerializer.serialize(page)
+            )
+        return Response(serializers.WordValuesSerializer.serialize(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    def get_validators(self, request, *args, **kwargs):
+        """
+        A word is validated by its modification date. A list is validated
+        by the count, largest id and latest modification date of the
+        filtered words, together with the query string that selects the
+        page. Keyset pages are not validated
+        """
+        if self.action == 'retrieve':
+            modified = Word.objects.filter(pk=kwargs['pk']) \
+                .values_list('modified_date', flat=True).first()
+            if modified is None:
+                return None
+            return (make_etag(kwargs['pk'], modified), modified)
+
+        if isinstance(self.paginator, WordKeysetPagination):
+            # keyset pages stay a single range query, without an aggregate
+            # over the whole filtered table
+            return None
+
+        aggregates = self.get_queryset().order_by().aggregate(
+            count=Count('id'),
+            last_id=Max('id'),
+            modified=Max('modified_date')
+        )
+        etag = make_etag(
+            request.get_full_path(),
+            aggregates['count'],
+            aggregates['last_id'],
+            aggregates['modified']
+        )
+        return (etag, aggregates['modified'])
+
+    @property
+    def paginator(self):
+        """
+        Use keyset pagination when the query parameter `pagination` is
+        `cursor`, page numbers otherwise
+        """
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = WordKeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    @action(detail=False)
+    def autocomplete(self, request):
+        """
+        Return the first words that start with the query parameter `q`
+        in the dictionary of the `source` and `target` languages. Results
+        come from the in-memory dictionary snapshot, not the database
+        """
+        prefix = request.query_params.get('q', '')
+        source = request.query_params.get('source', None)
+        target = request.query_params.get('target', None)
+        if source is None or target is None:
+            return Response(
+                {'detail': 'source and target are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        languages = set(lang for (lang, name) in Word.LANGUAGE_CHOICES)
+        if source not in languages or target not in languages:
+            return Response(
+                {'detail': 'Unknown source or target language'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get(
+                'limit', self.autocomplete_limit
+            ))
+        except ValueError:
+            limit = self.autocomplete_limit
+        limit = max(1, min(limit, self.autocomplete_max_limit))
+
+        snapshot = snapshots.get(source, target)
+        return Response(snapshot.complete(prefix, limit))
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Create and update many words in one request. The body is a list
+        of words; items with an `id` update that word (partially), the
+        others create a word. Items are validated like single words, and
+        either all of them are written in one transaction or, if any item
+        is invalid, none is. The response lists the result of each item:
+        created, updated, or on failure valid or error
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'detail': 'Expected a list of words'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.batch_max_size:
+            return Response(
+                {'detail': 'At most %d words per batch'
+                           % self.batch_max_size},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        (results, language_pairs) = word_batch.validate_batch(
+            items, request.user, serializers.WordSerializer
+        )
+        if any(result['status'] == 'error' for result in results):
+            # nothing is written; report the items that passed as valid
+            for result in results:
+                if result.pop('word', None) is not None:
+                    result['status'] = 'valid'
+            return Response(results, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            word_batch.write_batch(results, language_pairs)
+        except word_batch.BatchConflict:
+            return Response(
+                {'detail': 'The batch conflicts with existing words'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        for result in results:
+            result['word'] = serializers.WordSerializer(result['word']).data
+        return Response(results)
+
+    @action(detail=False, url_path='export')
+    def export_words(self, request):
+        """
+        Stream the words, optionally filtered like the word list, as CSV
+        or, with `type=jsonl`, as JSON lines
+        """
+        export_type = request.query_params.get('type', word_io.CSV)
+        if export_type not in word_io.FORMATS:
+            return Response(
+                {'detail': 'type must be csv or jsonl'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        content_type = {
+            word_io.CSV: 'text/csv; charset=utf-8',
+            word_io.JSONL: 'application/x-ndjson; charset=utf-8'
+        }[export_type]
+
+        response = StreamingHttpResponse(
+            word_io.export_words(self.get_queryset(), export_type),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = \
+            'attachment; filename="words.%s"' % export_type
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_words(self, request):
+        """
+        Insert or update words from an uploaded CSV or JSONL `file`.
+        The format comes from the `type` parameter or the file name
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'file': 'This field is required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        import_type = request.query_params.get(
+            'type', word_io.guess_format(upload.name)
+        )
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        try:
+            counts = word_io.import_words(
+                word_io.read_words(lines, import_type),
+                user=request.user
+            )
+        except UnicodeDecodeError:
+            # batches before the undecodable line stay imported; importing
+            # them again updates the same words
+            return Response(
+                {'file': 'The file must be UTF-8 encoded.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(counts)
+
 
 class WordPropertiesListView(generics.ListCreateAPIView):
     """Manage word properties in the database"""
@@ -90,16 +506,95 @@ class WordPropertiesListView(generics.ListCreateAPIView):
     queryset = WordProperties.objects.all()
     authentication_classes = (TokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = StandardResultsSetPagination
 
     def get(self, request, *args, **kwargs):
-        """Retrieve the word properties for the authenticated user"""
+        """
+        Retrieve the word properties for the authenticated user, one page
+        at a time. Optionally filtered by `chapter` and by the `source`
+        and `target` languages of the chapter. With `distinct=true` the
+        rows are grouped by word, with frequencies summed over chapters.
+        With `stream=true` all the rows are streamed as one JSON array
+        instead of a page
+        """
+        chapter = self.request.query_params.get('chapter', None)
+        source = self.request.query_params.get('source', None)
+        target = self.request.query_params.get('target', None)
+        distinct = self.request.query_params.get('distinct', '') \
+            .lower() in ('1', 'true')
+        stream = self.request.query_params.get('stream', '') \
+            .lower() in ('1', 'true')
+
+        if chapter is not None:
+            try:
+                chapter = int(chapter)
+            except ValueError:
+                return Response(
+                    {'detail': 'chapter must be an integer'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
         wordproperties_list = self.queryset.filter(
             chapter__created_by=self.request.user
         )
-        serializer = serializers.WordPropertiesSerializer(
-            wordproperties_list, many=True
-        )
-        return Response(serializer.data)
+        if chapter is not None:
+            wordproperties_list = wordproperties_list.filter(
+                chapter_id=chapter
+            )
+        if source is not None:
+            wordproperties_list = wordproperties_list.filter(
+                chapter__source_lang=source
+            )
+        if target is not None:
+            wordproperties_list = wordproperties_list.filter(
+                chapter__target_lang=target
+            )
+
+        if distinct:
+            wordproperties_list = wordproperties_list.values(
+                'word',
+                'word__lemma',
+                'word__translation',
+                'word__pos',
+                'word__gender',
+                'word__pronunciation'
+            ).annotate(
+                frequency=Sum('frequency'),
+                chapters=Count('chapter', distinct=True)
+            ).order_by('word__lemma', 'word')
+            if stream:
+                return streaming_json_response(
+                    request,
+                    wordproperties_list,
+                    serializers.WordFrequencyValuesSerializer
+                )
+            serializer_class = serializers.WordFrequencySerializer
+        elif stream:
+            return streaming_json_response(
+                request,
+                wordproperties_list.values(
+                    *serializers.WordPropertiesValuesSerializer.lookups()
+                ).order_by('-id'),
+                serializers.WordPropertiesValuesSerializer
+            )
+        else:
+            wordproperties_list = wordproperties_list.select_related('word') \
+                .only(
+                    'id',
+                    'token',
+                    'frequency',
+                    'word__id',
+                    'word__lemma',
+                    'word__translation',
+                    'word__pos',
+                    'word__gender',
+                    'word__pronunciation'
+                ).order_by('-id')
+            serializer_class = serializers.WordPropertiesSerializer
+
+        page = self.paginate_queryset(wordproperties_list)
+        serializer = serializer_class(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def post(self, request, *args, **kwargs):
         write_serializer = serializers.WordPropertiesCreateSerializer(
@@ -113,13 +608,20 @@ class WordPropertiesListView(generics.ListCreateAPIView):
             return Response(
                 read_serializer.data, status=status.HTTP_201_CREATED
             )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            write_serializer.errors, status=status.HTTP_400_BAD_REQUEST
+        )
 
 
 class WordPropertiesDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = WordProperties.objects.all()
     serializer_class = serializers.WordPropertiesDetailSerializer
 
+    def perform_destroy(self, instance):
+        """Delete the word properties and invalidate their chapter"""
+        instance.delete()
+        chapter_cache.invalidate_chapter(instance.chapter_id)
+
 
 class LearningDataViewSet(viewsets.ModelViewSet):
     """Manage learning data in the database"""
@@ -127,15 +629,63 @@ class LearningDataViewSet(viewsets.ModelViewSet):
     queryset = LearningData.objects.all()
     authentication_classes = (TokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
+    bulk_max_size = 1000
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Set the learned state of many words for the authenticated user.
+        The body is a list of {word, learned}; rows are created or updated
+        with one upsert and the final states are returned
+        """
+        write_serializer = serializers.LearningDataStateSerializer(
+            data=request.data, many=True
+        )
+        if not write_serializer.is_valid():
+            return Response(
+                write_serializer.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(write_serializer.validated_data) > self.bulk_max_size:
+            return Response(
+                {'detail': 'At most %d items per request'
+                           % self.bulk_max_size},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # later items for the same word win
+        states = OrderedDict(
+            (item['word'], item['learned'])
+            for item in write_serializer.validated_data
+        )
+        existing = set(
+            Word.objects.filter(id__in=states).values_list('id', flat=True)
+        )
+        missing = [word for word in states if word not in existing]
+        if missing:
+            return Response(
+                {'word': ['Invalid word id %s' % word for word in missing]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        learningdata_list = upsert_learning_data(request.user, states)
+        read_serializer = serializers.LearningDataSerializer(
+            learningdata_list, many=True
+        )
+        return Response(read_serializer.data)
 
 
 class ChapterListView(generics.ListCreateAPIView):
     queryset = Chapter.objects.all()
-    serializer_class = serializers.ChapterSerializer
+    serializer_class = serializers.ChapterListSerializer
     authentication_classes = (TokenAuthentication,)
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    pagination_class = StandardResultsSetPagination
 
     def get(self, request, *args, **kwargs):
+        """
+        List the chapters visible to the user, one page at a time. The body
+        is not loaded; a summary is cut from it in the database instead
+        """
         source = self.request.query_params.get('source', None)
         target = self.request.query_params.get('target', None)
         if not request.user.username:
@@ -148,25 +698,202 @@ class ChapterListView(generics.ListCreateAPIView):
             self.queryset = self.queryset.filter(source_lang=source)
         if target is not None:
             self.queryset = self.queryset.filter(target_lang=target)
-        serializer = serializers.ChapterSerializer(self.queryset, many=True)
-        return Response(serializer.data)
+
+        # anonymous users see only public chapters, so their pages are
+        # the same for everyone and served from the cache
+        anonymous = not request.user.username
+        if anonymous:
+            url = request.build_absolute_uri()
+            version = chapter_cache.list_version()
+            data = chapter_cache.get_chapter_list(version, url)
+            if data is not None:
+                return Response(data)
+
+        queryset = self.queryset.defer('body').annotate(
+            body_summary=Substr('body', 1, SUMMARY_LENGTH)
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = serializers.ChapterListSerializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        if anonymous:
+            chapter_cache.set_chapter_list(version, url, response.data)
+        return response
 
     def post(self, request, *args, **kwargs):
+        """
+        Create a chapter. With `async=true` in the query parameters the
+        analysis is queued and the response is 202 with the analysis job
+        """
+        run_async = self.request.query_params.get('async', '') \
+            .lower() in ('1', 'true')
         write_serializer = serializers.ChapterCreateSerializer(
-            data=request.data
+            data=request.data,
+            context={'async': run_async}
         )
         if write_serializer.is_valid():
             chapter = write_serializer.save()
+            if run_async:
+                job_serializer = serializers.AnalysisJobSerializer(
+                    write_serializer.job
+                )
+                return Response(
+                    job_serializer.data, status=status.HTTP_202_ACCEPTED
+                )
+            chapter = Chapter.objects.prefetch_related(
+                vocabulary_prefetch()
+            ).get(pk=chapter.pk)
             read_serializer = serializers.ChapterDetailSerializer(chapter)
             return Response(
                 read_serializer.data, status=status.HTTP_201_CREATED
             )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            write_serializer.errors, status=status.HTTP_400_BAD_REQUEST
+        )
 
 
-class ChapterDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ChapterPreviewView(APIView):
+    """Preview the vocabulary of a text without saving a chapter"""
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):
+        """
+        Analyze a text and return its words. The default `mode=accurate`
+        runs the full spacy pipeline; `mode=fast` only tokenizes the text
+        and uses lookup lemmas, which is approximate but much faster
+        """
+        mode = self.request.query_params.get('mode', 'accurate').lower()
+        if mode not in ('accurate', 'fast'):
+            return Response(
+                {'detail': 'mode must be accurate or fast'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = serializers.ChapterPreviewSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        wordproperties_list = serializer.preview(fast=(mode == 'fast'))
+        words = serializers.WordPreviewSerializer(
+            wordproperties_list, many=True
+        )
+        return Response({'mode': mode, 'words': words.data})
+
+
+class ChapterDetailView(ConditionalGetMixin,
+                        generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a chapter"""
     authentication_classes = (TokenAuthentication,)
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     queryset = Chapter.objects.all()
     serializer_class = serializers.ChapterDetailSerializer
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    def get_queryset(self):
+        """
+        Load the vocabulary of the chapter in one extra query. Reads
+        load it as values() rows instead, see get_serializer_class
+        """
+        if self.request.method in permissions.SAFE_METHODS:
+            return self.queryset
+        return self.queryset.prefetch_related(vocabulary_prefetch())
+
+    def get_serializer_class(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return serializers.ChapterDetailValuesSerializer
+        return self.serializer_class
+
+    def perform_update(self, serializer):
+        """
+        Save the chapter and update its word properties from the changed
+        paragraphs of the title and body. The text is analyzed first, so
+        the transaction only holds the writes
+        """
+        chapter = serializer.instance
+        data = serializer.validated_data
+        analysis = analyze_edit(
+            chapter,
+            chapter.title,
+            chapter.body,
+            data.get('title', chapter.title),
+            data.get('body', chapter.body)
+        )
+        if analysis is None:
+            raise serializers.ServiceUnavailable()
+        with transaction.atomic():
+            chapter = serializer.save()
+            apply_edit(chapter, analysis)
+
+    def get(self, request, *args, **kwargs):
+        """
+        Retrieve a chapter. Public chapters are served from the response
+        cache when it holds them, without querying the database
+        """
+        pk = kwargs['pk']
+        version = chapter_cache.chapter_version(pk)
+        self.cached = chapter_cache.get_chapter(pk, version)
+        if self.cached is not None:
+            handler = self.get_cached
+        else:
+            handler = super().get
+
+        response = self.conditional_response(
+            request, handler, *args, **kwargs
+        )
+        if self.cached is None and response.status_code == 200 \
+                and response.data['public']:
+            (etag, last_modified) = self.validators
+            chapter_cache.set_chapter(pk, version, {
+                'etag': etag,
+                'last_modified': last_modified,
+                'data': response.data
+            })
+        return response
+
+    def get_cached(self, request, *args, **kwargs):
+        return Response(self.cached['data'])
+
+    def get_validators(self, request, *args, **kwargs):
+        """
+        Validate a chapter by its modification date and by the number,
+        largest id and latest word modification of its word properties,
+        all read in one aggregate query
+        """
+        if self.cached is not None:
+            return (self.cached['etag'], self.cached['last_modified'])
+
+        row = Chapter.objects.filter(pk=kwargs['pk']).values(
+            'modified_date'
+        ).annotate(
+            count=Count('wordproperties'),
+            last_id=Max('wordproperties'),
+            words_modified=Max('wordproperties__word__modified_date')
+        ).order_by().first()
+        if row is None:
+            return None
+        last_modified = row['modified_date']
+        if row['words_modified'] is not None:
+            last_modified = max(last_modified, row['words_modified'])
+        etag = make_etag(
+            kwargs['pk'],
+            row['modified_date'],
+            row['count'],
+            row['last_id'],
+            row['words_modified']
+        )
+        self.validators = (etag, last_modified)
+        return self.validators
+
+
+class AnalysisJobDetailView(generics.RetrieveAPIView):
+    """Retrieve the status of a chapter analysis job"""
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+    queryset = AnalysisJob.objects.all()
+    serializer_class = serializers.AnalysisJobSerializer
+
+    def get_queryset(self):
+        """Limit jobs to chapters of the authenticated user"""
+        return self.queryset.filter(chapter__created_by=self.request.user)
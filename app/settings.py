@@ -137,6 +137,26 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static')
 ]
 
+# Dictionary lookups during chapter analysis use an in-memory snapshot of
+# the Word table per language pair. Snapshots are rebuilt when a word
+# changes (tracked through the default cache) or after the maximum age in
+# seconds, whichever comes first. The local-memory cache is per process,
+# so other processes see a changed word only after the maximum age.
+DICTIONARY_SNAPSHOT = True
+DICTIONARY_SNAPSHOT_MAX_AGE = 300
+
+# Serialized public chapters are cached and dropped by signals when the
+# chapter, its word properties or their words change. The local-memory
+# cache is per process, so the timeout in seconds bounds how long other
+# processes may serve a changed chapter.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'vocabulary',
+    }
+}
+PUBLIC_CHAPTER_CACHE_TIMEOUT = 60
+
 CSRF_COOKIE_NAME = "csrftoken"
 
 CORS_ALLOW_CREDENTIALS = True
@@ -1,8 +1,11 @@
 from django.contrib import admin
 
-from .models import Word, Chapter, WordProperties, LearningData
+from .models import Word, Chapter, WordProperties, LearningData, \
+                    AnalysisJob, TextAnalysis
 
 admin.site.register(Word)
 admin.site.register(Chapter)
 admin.site.register(WordProperties)
 admin.site.register(LearningData)
+admin.site.register(AnalysisJob)
+admin.site.register(TextAnalysis)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class VocabularyConfig(AppConfig):
     name = 'vocabulary'
+
+    def ready(self):
+        import vocabulary.signals  # noqa: F401
@@ -0,0 +1,103 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from vocabulary.models import WordProperties
+
+CHAPTER_VERSION_KEY = 'vocabulary:public-chapter-version:{}'
+CHAPTER_KEY = 'vocabulary:public-chapter:{}:{}'
+LIST_VERSION_KEY = 'vocabulary:public-chapter-list-version'
+LIST_KEY = 'vocabulary:public-chapter-list:{}:{}'
+
+# number of word ids per query when finding chapters that use words
+INVALIDATE_BATCH_SIZE = 500
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        # start from the clock so a lost key never repeats an old version
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), None)
+
+
+def _bump_now_and_on_commit(key):
+    """Bump a version now and again when the transaction commits
+
+    The second bump drops entries cached from data read before the
+    commit, between the first bump and the commit.
+    """
+    _bump(key)
+    transaction.on_commit(lambda: _bump(key))
+
+
+def _timeout():
+    return getattr(settings, 'PUBLIC_CHAPTER_CACHE_TIMEOUT', 300)
+
+
+def chapter_version(chapter_id):
+    """Return the cache version of a chapter, read before loading it"""
+    return _version(CHAPTER_VERSION_KEY.format(chapter_id))
+
+
+def get_chapter(chapter_id, version):
+    """Return the cached {'etag', 'last_modified', 'data'} of a public
+    chapter, or None"""
+    return cache.get(CHAPTER_KEY.format(chapter_id, version))
+
+
+def set_chapter(chapter_id, version, entry):
+    cache.set(CHAPTER_KEY.format(chapter_id, version), entry, _timeout())
+
+
+def list_version():
+    """Return the cache version of the public chapter list"""
+    return _version(LIST_VERSION_KEY)
+
+
+def _list_key(version, url):
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return LIST_KEY.format(version, digest)
+
+
+def get_chapter_list(version, url):
+    """Return the cached page of public chapters for a URL, or None"""
+    return cache.get(_list_key(version, url))
+
+
+def set_chapter_list(version, url, data):
+    cache.set(_list_key(version, url), data, _timeout())
+
+
+def invalidate_chapter(chapter_id):
+    """Drop the cached payloads of a chapter and the public chapter list"""
+    _bump_now_and_on_commit(CHAPTER_VERSION_KEY.format(chapter_id))
+    _bump_now_and_on_commit(LIST_VERSION_KEY)
+
+
+def invalidate_words(word_ids):
+    """Drop the cached payloads of public chapters that use the words
+
+    Called on Word save. Code that updates words with bulk operations,
+    which send no signals, must call this itself.
+    """
+    word_ids = list(word_ids)
+    chapter_ids = set()
+    for i in range(0, len(word_ids), INVALIDATE_BATCH_SIZE):
+        chapter_ids.update(WordProperties.objects.filter(
+            word_id__in=word_ids[i:i + INVALIDATE_BATCH_SIZE],
+            chapter__public=True
+        ).values_list('chapter_id', flat=True).distinct())
+    for chapter_id in chapter_ids:
+        _bump_now_and_on_commit(CHAPTER_VERSION_KEY.format(chapter_id))
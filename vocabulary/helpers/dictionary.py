@@ -0,0 +1,259 @@
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from vocabulary.models import Word, normalize_lemma
+
+VERSION_KEY = 'vocabulary:dictionary-version:{}:{}'
+
+# number of autocomplete results kept per snapshot
+COMPLETION_CACHE_SIZE = 1024
+
+# number of language pair snapshots kept per process, the least recently
+# built are dropped first
+SNAPSHOT_LIMIT = len(Word.LANGUAGE_CHOICES) ** 2
+
+# Word columns kept in a snapshot, in model field order
+SNAPSHOT_FIELDS = (
+    'id',
+    'lemma',
+    'normalized_lemma',
+    'translation',
+    'pos',
+    'gender',
+    'pronunciation',
+)
+
+
+def dictionary_version(source_lang, target_lang):
+    """Return the current version of a language pair's dictionary
+
+    The version lives in the default cache, so it is shared by every
+    process that uses the same cache backend. With the per-process
+    LocMemCache of the default settings other processes do not see the
+    change, and their snapshots follow it only after
+    DICTIONARY_SNAPSHOT_MAX_AGE.
+    """
+    key = VERSION_KEY.format(source_lang, target_lang)
+    version = cache.get(key)
+    if version is None:
+        # start from the clock so a lost key never repeats an old version
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_dictionary_version(source_lang, target_lang):
+    """Mark the dictionary of a language pair as changed
+
+    Called on Word save and delete. Code that writes words with bulk
+    operations, which send no signals, must call this itself.
+
+    The version is bumped now and again when the transaction commits, so
+    a snapshot rebuilt before the commit from the old rows is dropped.
+    """
+    key = VERSION_KEY.format(source_lang, target_lang)
+    _bump(key)
+    transaction.on_commit(lambda: _bump(key))
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), None)
+
+
+class DictionarySnapshot:
+    """Read-only, in-memory copy of the Word table for one language pair
+
+    Columns are stored as parallel sequences: ids in an array, strings in
+    interned lists. A hash index maps each normalized lemma to the rows
+    with that lemma, and a sorted index over the normalized lemmas serves
+    prefix searches.
+    """
+
+    def __init__(self, source_lang, target_lang, version):
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.version = version
+        self.built = time.monotonic()
+        self.ids = array('q')
+        self.lemmas = []
+        self.normalized_lemmas = []
+        self.translations = []
+        self.pos = []
+        self.genders = []
+        self.pronunciations = []
+        self.index = {}
+        self._sorted_keys = None
+        self._sorted_rows = None
+        self._completions = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, source_lang, target_lang, version=None):
+        """Load the dictionary of a language pair from the database"""
+        snapshot = cls(source_lang, target_lang, version)
+        rows = Word.objects.filter(
+            source_lang=source_lang,
+            target_lang=target_lang
+        ).order_by('lemma', 'id').values_list(*SNAPSHOT_FIELDS)
+
+        index = {}
+        intern = sys.intern
+        for row, (id, lemma, normalized, translation, pos, gender,
+                  pronunciation) in enumerate(rows.iterator(chunk_size=5000)):
+            normalized = intern(normalized)
+            snapshot.ids.append(id)
+            snapshot.lemmas.append(intern(lemma))
+            snapshot.normalized_lemmas.append(normalized)
+            snapshot.translations.append(intern(translation))
+            snapshot.pos.append(intern(pos))
+            snapshot.genders.append(gender and intern(gender))
+            snapshot.pronunciations.append(pronunciation)
+            index.setdefault(normalized, []).append(row)
+
+        snapshot.index = {key: tuple(rows) for key, rows in index.items()}
+        return snapshot
+
+    def __len__(self):
+        return len(self.ids)
+
+    def word(self, row):
+        """Return the Word stored at a row, with other fields deferred"""
+        return Word.from_db(
+            DEFAULT_DB_ALIAS,
+            SNAPSHOT_FIELDS + ('source_lang', 'target_lang'),
+            (
+                self.ids[row],
+                self.lemmas[row],
+                self.normalized_lemmas[row],
+                self.translations[row],
+                self.pos[row],
+                self.genders[row],
+                self.pronunciations[row],
+                self.source_lang,
+                self.target_lang,
+            )
+        )
+
+    def lookup(self, lemma):
+        """Return the Word objects for a lemma, ignoring case"""
+        rows = self.index.get(normalize_lemma(lemma), ())
+        return [self.word(row) for row in rows]
+
+    def _prefix_index(self):
+        """Return normalized lemmas in sorted order and their rows"""
+        if self._sorted_keys is None:
+            with self._lock:
+                if self._sorted_keys is None:
+                    keys = self.normalized_lemmas
+                    rows = sorted(range(len(keys)), key=keys.__getitem__)
+                    self._sorted_rows = array('l', rows)
+                    self._sorted_keys = [keys[row] for row in rows]
+        return self._sorted_keys, self._sorted_rows
+
+    def complete(self, prefix, limit=10):
+        """Return the first words whose lemma starts with a prefix
+
+        Parameters:
+        prefix (string): beginning of a lemma, any case
+        limit (int): maximum number of results
+
+        Returns:
+        list: [{'id', 'lemma', 'translation', 'pos'}] in lemma order
+        """
+        prefix = normalize_lemma(prefix)
+        key = (prefix, limit)
+        completions = self._completions
+        try:
+            result = completions[key]
+            completions.move_to_end(key)
+            return result
+        except KeyError:
+            pass
+
+        keys, rows = self._prefix_index()
+        result = []
+        position = bisect_left(keys, prefix)
+        while position < len(keys) and len(result) < limit \
+                and keys[position].startswith(prefix):
+            row = rows[position]
+            result.append({
+                'id': self.ids[row],
+                'lemma': self.lemmas[row],
+                'translation': self.translations[row],
+                'pos': self.pos[row],
+            })
+            position += 1
+
+        with self._lock:
+            completions[key] = result
+            if len(completions) > COMPLETION_CACHE_SIZE:
+                completions.popitem(last=False)
+        return result
+
+    def find_words(self, lemmas):
+        """Same as helpers_fr_fi.find_words, without querying the database"""
+        found = {}
+        for lemma in lemmas:
+            key = normalize_lemma(lemma)
+            if key not in found and key in self.index:
+                found[key] = [self.word(row) for row in self.index[key]]
+        return found
+
+
+class DictionarySnapshots:
+    """Process-wide snapshots, rebuilt lazily when the version changes
+
+    A snapshot older than DICTIONARY_SNAPSHOT_MAX_AGE seconds is also
+    rebuilt, which bounds staleness when the cache is not shared between
+    processes. At most SNAPSHOT_LIMIT snapshots are kept.
+    """
+
+    def __init__(self):
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, source_lang, target_lang):
+        """Return an up-to-date snapshot for a language pair"""
+        key = (source_lang, target_lang)
+        version = dictionary_version(source_lang, target_lang)
+        max_age = getattr(settings, 'DICTIONARY_SNAPSHOT_MAX_AGE', 300)
+
+        snapshot = self._snapshots.get(key)
+        if self._is_current(snapshot, version, max_age):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if not self._is_current(snapshot, version, max_age):
+                snapshot = DictionarySnapshot.build(
+                    source_lang, target_lang, version
+                )
+                self._snapshots.pop(key, None)
+                self._snapshots[key] = snapshot
+                if len(self._snapshots) > SNAPSHOT_LIMIT:
+                    self._snapshots.popitem(last=False)
+        return snapshot
+
+    @staticmethod
+    def _is_current(snapshot, version, max_age):
+        return snapshot is not None \
+            and snapshot.version == version \
+            and time.monotonic() - snapshot.built < max_age
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+
+
+snapshots = DictionarySnapshots()
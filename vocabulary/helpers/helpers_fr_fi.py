@@ -1,13 +1,48 @@
-from vocabulary.models import Word, Chapter, WordProperties
+from vocabulary.models import Word, Chapter, WordProperties, TextAnalysis, \
+                              AnalysisJob, normalize_lemma
 
+import hashlib
+import json
+import re
 import sys
-import spacy
-import fr_core_news_sm
-import it_core_news_sm
+import unicodedata
+from datetime import timedelta
+
+import numpy
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from spacy.attrs import LEMMA, POS, IS_ALPHA, LOWER
+
+from vocabulary.helpers.dictionary import snapshots
+from vocabulary.helpers.chapter_cache import invalidate_chapter
+from vocabulary.helpers.spacy_models import registry
+
+# maximum number of lemmas in one IN list when querying the dictionary
+LOOKUP_BATCH_SIZE = 500
+
+# number of rows per INSERT when saving word properties
+BULK_BATCH_SIZE = 1000
+
+# texts longer than this many characters are analyzed in chunks
+STREAMING_THRESHOLD = 100000
+# maximum length of one chunk in characters
+CHUNK_SIZE = 10000
+# number of chunks spacy processes at a time
+PIPE_BATCH_SIZE = 8
+
+# days a stored text analysis is kept
+TEXT_ANALYSIS_MAX_AGE_DAYS = 90
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
 
 def spacy_analyze(fulltext, source_lang):
     """Use spacy to analyze input text
 
+    The spacy model is loaded once per process by the model registry and
+    shared between calls.
+
     Parameters:
     fulltext (string): text
     source_lang (string): language of the input text
@@ -18,32 +53,117 @@ def spacy_analyze(fulltext, source_lang):
     """
     doc = None
 
-    if (source_lang == 'fr'):
+    if source_lang in registry.packages:
         try:
-            nlp = fr_core_news_sm.load(disable=['parser', 'ner'])
+            nlp = registry.get(source_lang)
             doc = nlp(fulltext)
         except:
             print(sys.exc_info()[0])
-    elif (source_lang == 'it'):
+
+    return doc
+
+def split_text(text, chunk_size=CHUNK_SIZE):
+    """Split text into chunks on paragraph and sentence boundaries
+
+    Paragraphs are packed into chunks of at most chunk_size characters.
+    A longer paragraph is split between sentences, and a longer sentence
+    between words.
+
+    Parameters:
+    text (string): text
+    chunk_size (int): maximum length of a chunk
+
+    Returns:
+    generator: chunks of text
+    """
+    def pieces():
+        for paragraph in PARAGRAPH_BREAK.split(text):
+            if len(paragraph) <= chunk_size:
+                yield paragraph
+                continue
+            for sentence in SENTENCE_END.split(paragraph):
+                while len(sentence) > chunk_size:
+                    cut = sentence.rfind(' ', 0, chunk_size)
+                    if cut <= 0:
+                        cut = chunk_size
+                    yield sentence[:cut]
+                    sentence = sentence[cut:]
+                yield sentence
+
+    chunk = []
+    length = 0
+    for piece in pieces():
+        if chunk and length + len(piece) + 1 > chunk_size:
+            yield '\n'.join(chunk)
+            chunk = []
+            length = 0
+        chunk.append(piece)
+        length += len(piece) + 1
+    if chunk:
+        yield '\n'.join(chunk)
+
+def spacy_analyze_stream(fulltext, source_lang, batch_size=PIPE_BATCH_SIZE):
+    """Use spacy to analyze a long text chunk by chunk
+
+    The chunks go through nlp.pipe lazily, so only batch_size chunks are
+    held in memory at a time whatever the length of the text.
+
+    Parameters:
+    fulltext (string): text
+    source_lang (string): language of the input text
+    batch_size (int): number of chunks processed together
+
+    Returns:
+    iterator: spacy Docs of the chunks, or None if there is no model
+
+    """
+    if source_lang not in registry.packages:
+        return None
+
+    try:
+        nlp = registry.get(source_lang)
+    except:
+        print(sys.exc_info()[0])
+        return None
+
+    return nlp.pipe(split_text(fulltext), batch_size=batch_size)
+
+def spacy_tokenize(fulltext, source_lang):
+    """Use only the spacy tokenizer for a fast, approximate analysis
+
+    No statistical component runs: lemmas come from the lookup table of
+    the language and tokens have no part-of-speech tag.
+
+    Parameters:
+    fulltext (string): text
+    source_lang (string): language of the input text
+
+    Returns:
+    Doc: tokenized text, or None if there is no model
+
+    """
+    doc = None
+
+    if source_lang in registry.packages:
         try:
-            nlp = it_core_news_sm.load(disable=['parser', 'ner'])
-            doc = nlp(fulltext)
+            nlp = registry.get(source_lang)
+            doc = nlp.make_doc(fulltext)
         except:
             print(sys.exc_info()[0])
 
     return doc
 
-def analyze_text(spacy_doc):
-    """Lemmatize, get word frequencies and part-of-speech tags
+def count_tokens(tokens, worddict):
+    """Add the lemmas of tokens to a word dictionary one token at a time
 
     Parameters:
-    spacy_doc (spacy nlp object): output from spacy_analyze
+    tokens (iterable): spacy tokens
+    worddict (dictionary): output from analyze_text, updated in place
 
     Returns:
-    dictionary: {'lemma': {'orig': list, 'pos': string, 'count': int}}
+    dictionary: worddict
     """
-    worddict = {}
-    for word in spacy_doc:
+    for word in tokens:
         key = word.lemma_.lower()
         # filter out non-alphabetic words
         if word.is_alpha:
@@ -72,9 +192,135 @@ def analyze_text(spacy_doc):
 
     return worddict
 
+def count_token_array(spacy_doc, worddict):
+    """Add the lemmas of a spacy Doc to a word dictionary with numpy
+
+    The lemma, part of speech and lowercase form of the alphabetic tokens
+    are read as one array with Doc.to_array and counted per distinct
+    (lemma, form) pair, so Python only loops over the distinct pairs.
+    Pairs are visited in the order of their first token, which gives the
+    same result as count_tokens.
+
+    Parameters:
+    spacy_doc (spacy Doc): analyzed text
+    worddict (dictionary): output from analyze_text, updated in place
+
+    Returns:
+    dictionary: worddict
+    """
+    array = spacy_doc.to_array([LEMMA, POS, IS_ALPHA, LOWER])
+    array = array[array[:, 2] != 0]
+    if not len(array):
+        return worddict
+
+    (pairs, first, counts) = numpy.unique(
+        array[:, [0, 3]],
+        axis=0,
+        return_index=True,
+        return_counts=True
+    )
+    strings = spacy_doc.vocab.strings
+    for i in numpy.argsort(first, kind='stable'):
+        key = strings[int(pairs[i, 0])].lower()
+        text = strings[int(pairs[i, 1])]
+        properties = worddict.get(key)
+        if properties is None:
+            properties = worddict[key] = {
+                'pos': strings[int(array[first[i], 1])],
+                'count': 0
+            }
+        properties['count'] += int(counts[i])
+        if text != key:
+            orig = properties.setdefault('orig', [])
+            if text not in orig:
+                orig.append(text)
+
+    return worddict
+
+def analyze_text(spacy_doc, worddict=None):
+    """Lemmatize, get word frequencies and part-of-speech tags
+
+    A spacy Doc is counted with count_token_array, other token iterables
+    with count_tokens.
+
+    Parameters:
+    spacy_doc (spacy nlp object): output from spacy_analyze, or any
+    iterable of tokens
+    worddict (dictionary): earlier output to add the text to, e.g. for
+    the chunks of one text
+
+    Returns:
+    dictionary: {'lemma': {'orig': list, 'pos': string, 'count': int}}
+    """
+    if worddict is None:
+        worddict = {}
+    if hasattr(spacy_doc, 'to_array'):
+        return count_token_array(spacy_doc, worddict)
+    return count_tokens(spacy_doc, worddict)
+
+def analyze_docs(docs):
+    """Analyze the chunks of a text together, see analyze_text
+
+    Parameters:
+    docs (iterable): spacy Docs, e.g. the output of spacy_analyze_stream
+
+    Returns:
+    dictionary: output from analyze_text for the whole text
+    """
+    worddict = {}
+    for doc in docs:
+        analyze_text(doc, worddict)
+    return worddict
+
+def find_words(lemmas, source_lang, target_lang):
+    """Find dictionary words for many lemmas with a few set-based queries
+
+    Lemmas are matched on the indexed normalized lemma in chunks of
+    LOOKUP_BATCH_SIZE, so the number of queries does not grow with the
+    number of lemmas until a chunk fills up.
+
+    Parameters:
+    lemmas (iterable): lemmas to look up
+    source_lang (string): source language
+    target_lang (string): target language
+
+    Returns:
+    dictionary: {'normalized lemma': list of Word objects}
+    """
+    keys = list(dict.fromkeys(normalize_lemma(lemma) for lemma in lemmas))
+    found = {}
+
+    for i in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        word_queryset = Word.objects.filter(
+            normalized_lemma__in=keys[i:i + LOOKUP_BATCH_SIZE],
+            source_lang=source_lang,
+            target_lang=target_lang
+        )
+        for w in word_queryset:
+            found.setdefault(w.normalized_lemma, []).append(w)
+
+    return found
+
+def dictionary_lookup(source_lang, target_lang):
+    """Return the find_words function to use for a language pair
+
+    With the DICTIONARY_SNAPSHOT setting (default True) lookups use the
+    in-memory dictionary snapshot and run no SQL once it is built.
+
+    Returns:
+    function: lemmas -> {'normalized lemma': list of Word objects}
+    """
+    if getattr(settings, 'DICTIONARY_SNAPSHOT', True):
+        return snapshots.get(source_lang, target_lang).find_words
+
+    return lambda lemmas: find_words(lemmas, source_lang, target_lang)
+
 def translate_words(worddict, source_lang, target_lang):
     """Find translations of words from database
 
+    Lemmas without a translation are looked up again by their first
+    original token. Both lookups are batched, see dictionary_lookup.
+
     Parameters:
     worddict (dictionary): {'lemma': {'pos': string, ...}}
     source_lang (string): source language
@@ -86,37 +332,323 @@ def translate_words(worddict, source_lang, target_lang):
 
     word_list = []
 
-    for key, info in worddict.items():
-        try:
-            # find translation from database
-            word_queryset = Word.objects.filter(
-                lemma__iexact=key,
-                source_lang=source_lang,
-                target_lang=target_lang
-            )
-            if word_queryset:
-                for w in word_queryset:
-                    word_list.append(w)
-            else:
-                print(key)
-                # extend the search
-                tokens = info.get('orig')
-                if tokens:
-                    print(tokens)
-                    token_queryset = Word.objects.filter(
-                        lemma__iexact=tokens[0],
-                        source_lang=source_lang,
-                        target_lang=target_lang
-                    )
-                    if token_queryset:
-                        for t in token_queryset:
-                            word_list.append(t)
-        except:
-            print(sys.exc_info()[0])
-            print ('error when querying database')
+    try:
+        lookup = dictionary_lookup(source_lang, target_lang)
+
+        # find translations from database
+        found = lookup(worddict)
+
+        # extend the search to the first token of untranslated lemmas
+        tokens = []
+        for key, info in worddict.items():
+            if normalize_lemma(key) not in found and info.get('orig'):
+                tokens.append(info['orig'][0])
+        found_tokens = lookup(tokens)
+
+        for key, info in worddict.items():
+            words = found.get(normalize_lemma(key))
+            if words:
+                word_list.extend(words)
+            elif info.get('orig'):
+                word_list.extend(
+                    found_tokens.get(normalize_lemma(info['orig'][0]), [])
+                )
+    except:
+        print(sys.exc_info()[0])
+        print ('error when querying database')
 
     return word_list
 
+def text_hash(fulltext, source_lang, target_lang):
+    """Return the key of a text's stored analysis
+
+    The text is NFC-normalized with runs of whitespace collapsed, and
+    hashed together with the languages and the spaCy model version.
+    """
+    normalized = ' '.join(unicodedata.normalize('NFC', fulltext).split())
+    key = '\x00'.join([
+        normalized,
+        source_lang,
+        target_lang,
+        str(registry.version(source_lang))
+    ])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def spacy_word_properties(fulltext, source_lang):
+    """Analyze a text with spacy, in chunks if it is long
+
+    Parameters:
+    fulltext (string): text
+    source_lang (string): language of the text
+
+    Returns:
+    dictionary: output from analyze_text, or None if the text could not
+    be analyzed
+
+    """
+    streaming = len(fulltext) > STREAMING_THRESHOLD
+    if streaming:
+        doc = spacy_analyze_stream(fulltext, source_lang)
+    else:
+        doc = spacy_analyze(fulltext, source_lang)
+    if not doc:
+        return None
+
+    try:
+        if streaming:
+            return analyze_docs(doc)
+        return analyze_text(doc)
+    except:
+        # streamed texts are analyzed while the tokens are read
+        print(sys.exc_info()[0])
+        return None
+
+def fast_word_properties(fulltext, source_lang):
+    """Analyze a text with the spacy tokenizer and lookup lemmas
+
+    Parameters:
+    fulltext (string): text
+    source_lang (string): language of the text
+
+    Returns:
+    dictionary: output from analyze_text with empty parts of speech, or
+    None if the text could not be analyzed
+
+    """
+    doc = spacy_tokenize(fulltext, source_lang)
+    if doc is None:
+        return None
+
+    # lookup lemmas are filled in when tokens are read, not by to_array
+    return count_tokens(doc, {})
+
+def analyze_words(fulltext, source_lang, target_lang, store=True):
+    """Analyze a text with spacy, or reuse the analysis of the same text
+
+    Results are stored in TextAnalysis by text_hash, so a text that was
+    analyzed before costs one query and no NLP.
+
+    Parameters:
+    fulltext (string): text
+    source_lang (string): source language
+    target_lang (string): target language
+    store (boolean): store the analysis of a new text
+
+    Returns:
+    dictionary: output from analyze_text, or None if the text could not
+    be analyzed
+
+    """
+    content_hash = text_hash(fulltext, source_lang, target_lang)
+    stored = TextAnalysis.objects.filter(content_hash=content_hash) \
+        .values_list('word_properties', flat=True).first()
+    if stored is not None:
+        return json.loads(stored)
+
+    word_properties = spacy_word_properties(fulltext, source_lang)
+    if word_properties is None or not store:
+        return word_properties
+
+    # a concurrent analysis of the same text may have stored it already
+    TextAnalysis.objects.bulk_create([TextAnalysis(
+        content_hash=content_hash,
+        source_lang=source_lang,
+        target_lang=target_lang,
+        model_version=str(registry.version(source_lang)),
+        word_properties=json.dumps(word_properties, ensure_ascii=False)
+    )], ignore_conflicts=True)
+    return word_properties
+
+def prune_text_analyses(max_age_days=TEXT_ANALYSIS_MAX_AGE_DAYS):
+    """Delete text analyses stored more than max_age_days ago
+
+    A pruned text is analyzed again the next time it is seen.
+
+    Parameters:
+    max_age_days (int): age in days of the oldest analysis kept
+
+    Returns:
+    int: number of deleted analyses
+
+    """
+    cutoff = timezone.now() - timedelta(days=max_age_days)
+    (deleted, _) = TextAnalysis.objects.filter(created_date__lt=cutoff) \
+        .delete()
+    return deleted
+
+def build_word_properties(fulltext, source_lang, target_lang, store=True):
+    """Analyze a text and build its word properties
+
+    The analysis of a text seen before is reused, see analyze_words;
+    words are always matched against the current dictionary.
+
+    Parameters:
+    fulltext (string): text
+    source_lang (string): source language
+    target_lang (string): target language
+    store (boolean): store the analysis of a new text
+
+    Returns:
+    list: unsaved WordProperties objects without a chapter, or None if
+    the text could not be analyzed
+
+    """
+    word_properties = analyze_words(
+        fulltext, source_lang, target_lang, store
+    )
+    if word_properties is None:
+        return None
+
+    word_list = translate_words(
+        word_properties,
+        source_lang,
+        target_lang
+    )
+
+    return make_word_properties(word_properties, word_list)
+
+def preview_word_properties(fulltext, source_lang, target_lang, fast=False):
+    """Build the word properties of a text without saving anything
+
+    Parameters:
+    fulltext (string): text
+    source_lang (string): source language
+    target_lang (string): target language
+    fast (boolean): use fast_word_properties instead of the full spacy
+    pipeline; words are then counted whatever their part of speech
+
+    Returns:
+    list: unsaved WordProperties objects without a chapter, or None if
+    the text could not be analyzed
+
+    """
+    if not fast:
+        return build_word_properties(
+            fulltext, source_lang, target_lang, store=False
+        )
+
+    word_properties = fast_word_properties(fulltext, source_lang)
+    if word_properties is None:
+        return None
+
+    word_list = translate_words(
+        word_properties,
+        source_lang,
+        target_lang
+    )
+
+    return make_word_properties(word_properties, word_list, match_pos=False)
+
+def make_word_properties(word_properties, word_list, match_pos=True):
+    """Build word properties from analyzed text and matched words
+
+    Parameters:
+    word_properties (dictionary): output from analyze_text
+    word_list (list): output from translate_words
+    match_pos (boolean): count a word only when its part of speech
+    matches the analysis
+
+    Returns:
+    list: unsaved WordProperties objects without a chapter
+
+    """
+    wordproperties_list = []
+    for w in word_list:
+        properties = word_properties.get(w.lemma)
+        wp = WordProperties()
+        if properties:
+            if not match_pos or properties['pos'] == w.pos:
+                wp.frequency = properties['count']
+                token_list = properties.get('orig')
+                if token_list:
+                    wp.token = ', '.join(token_list)
+        wp.word = w
+        wordproperties_list.append(wp)
+
+    return wordproperties_list
+
+def save_word_properties(chapter, wordproperties_list):
+    """Insert the word properties of a chapter in batches
+
+    Parameters:
+    chapter (Chapter object): saved chapter
+    wordproperties_list (list): unsaved WordProperties objects
+
+    """
+    for wp in wordproperties_list:
+        wp.chapter = chapter
+    WordProperties.objects.bulk_create(
+        wordproperties_list,
+        batch_size=BULK_BATCH_SIZE
+    )
+    invalidate_chapter(chapter.pk)
+
+def analyze_chapter(chapter, job=None):
+    """Analyze a saved chapter and save its word properties
+
+    The word properties replace those of the chapter in one transaction,
+    so a failed analysis leaves no partial vocabulary behind and running
+    the analysis again does not duplicate it. The chapter row is locked
+    meanwhile, so concurrent analyses of a chapter write one at a time.
+
+    Parameters:
+    chapter (Chapter object): chapter to analyze
+    job (AnalysisJob object): running job marked done in the same
+    transaction
+
+    Returns:
+    boolean: True if text was analyzed, False if not
+
+    """
+    wordproperties_list = build_word_properties(
+        chapter.title + ' ' + chapter.body,
+        chapter.source_lang,
+        chapter.target_lang
+    )
+    if wordproperties_list is None:
+        return False
+
+    with transaction.atomic():
+        Chapter.objects.select_for_update().values_list('id') \
+            .get(pk=chapter.pk)
+        chapter.wordproperties_set.all().delete()
+        save_word_properties(chapter, wordproperties_list)
+        if job is not None:
+            job.status = AnalysisJob.DONE
+            job.finished_date = timezone.now()
+            job.save(update_fields=['status', 'finished_date'])
+
+    return True
+
+def create_chapter(
+    body,
+    source_lang,
+    target_lang,
+    title,
+    public=False,
+    user=None,
+    commit=True):
+    """Create a chapter without analyzing it
+
+    Parameters are the same as for save_chapter. The chapter is saved
+    unless commit is False.
+
+    Returns:
+    Chapter: Chapter object created from the given parameters
+
+    """
+    chapter = Chapter()
+    chapter.body = body
+    chapter.created_by = user
+    chapter.title = title
+    chapter.source_lang = source_lang
+    chapter.target_lang = target_lang
+    chapter.public = public
+    if commit:
+        chapter.save()
+
+    return chapter
+
 def save_chapter(
     body,
     source_lang,
@@ -126,6 +658,10 @@ def save_chapter(
     user=None):
     """Save chapter to database
 
+    The text is analyzed before anything is written. The chapter and its
+    word properties are then saved in one transaction; if the text cannot
+    be analyzed, nothing is saved.
+
     Parameters:
     body (string): input text
     source_lang (string): source language
@@ -139,42 +675,26 @@ def save_chapter(
     boolean: True if text was analyzed, False if not
 
     """
-    # save chapter
-    chapter = Chapter()
-    chapter.body = body
-    chapter.created_by = user
-    chapter.title = title
-    chapter.source_lang = source_lang
-    chapter.target_lang = target_lang
-    chapter.public = public
-    chapter.save()
-
-    fulltext = title + ' ' + body
+    chapter = create_chapter(
+        body,
+        source_lang,
+        target_lang,
+        title,
+        public,
+        user,
+        commit=False
+    )
 
-    doc = spacy_analyze(fulltext, source_lang)
-    if doc:
-        word_properties = analyze_text(doc)
+    wordproperties_list = build_word_properties(
+        title + ' ' + body,
+        source_lang,
+        target_lang
+    )
+    if wordproperties_list is None:
+        return (chapter, False)
 
-        word_list = translate_words(
-            word_properties,
-            source_lang,
-            target_lang
-        )
+    with transaction.atomic():
+        chapter.save()
+        save_word_properties(chapter, wordproperties_list)
 
-        # save word properties related to chapter
-        for w in word_list:
-            properties = word_properties.get(w.lemma)
-            wp = WordProperties()
-            if properties:
-                if properties['pos'] == w.pos:
-                    wp.frequency = properties['count']
-                    token_list = properties.get('orig')
-                    if token_list:
-                        wp.token = ', '.join(token_list)
-            wp.chapter = chapter
-            wp.word = w
-            wp.save()
-
-        return (chapter, True)
-
-    return (chapter, False)
+    return (chapter, True)
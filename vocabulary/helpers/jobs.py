@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from vocabulary.models import AnalysisJob
+from vocabulary.helpers.helpers_fr_fi import analyze_chapter
+
+logger = logging.getLogger(__name__)
+
+# seconds between heartbeats of a running job
+HEARTBEAT_SECONDS = 60
+# running jobs without a heartbeat for this long are taken to belong to a
+# worker that died, and are queued again
+STALE_JOB_MINUTES = 5
+
+
+def enqueue_analysis(chapter):
+    """Queue a chapter for analysis by the worker
+
+    Parameters:
+    chapter (Chapter object): saved chapter
+
+    Returns:
+    AnalysisJob: the queued job
+    """
+    return AnalysisJob.objects.create(chapter=chapter)
+
+
+def claim_next_job():
+    """Take the oldest queued job and mark it as running
+
+    The claim is a conditional UPDATE on the job status, so several
+    workers can poll the same table without processing a job twice.
+
+    Returns:
+    AnalysisJob: claimed job, or None if the queue is empty
+    """
+    while True:
+        job = AnalysisJob.objects.filter(
+            status=AnalysisJob.QUEUED
+        ).order_by('created_date', 'id').first()
+        if job is None:
+            return None
+
+        started_date = timezone.now()
+        claimed = AnalysisJob.objects.filter(
+            pk=job.pk,
+            status=AnalysisJob.QUEUED
+        ).update(
+            status=AnalysisJob.RUNNING,
+            started_date=started_date,
+            heartbeat_date=started_date
+        )
+        if claimed:
+            job.status = AnalysisJob.RUNNING
+            job.started_date = started_date
+            job.heartbeat_date = started_date
+            return job
+
+
+def beat(job_id, stop, interval=HEARTBEAT_SECONDS):
+    """Refresh the heartbeat of a running job every interval seconds
+    until stop is set
+
+    Parameters:
+    job_id (int): id of the running job
+    stop (threading.Event): set when the job finishes
+    interval (float): seconds between heartbeats
+    """
+    while not stop.wait(interval):
+        AnalysisJob.objects.filter(
+            pk=job_id,
+            status=AnalysisJob.RUNNING
+        ).update(heartbeat_date=timezone.now())
+
+
+def run_job(job, heartbeat_interval=HEARTBEAT_SECONDS):
+    """Analyze the chapter of a claimed job and record the outcome
+
+    A thread keeps the heartbeat of the job fresh while the chapter is
+    analyzed, see requeue_stale_jobs. A successful job is marked done
+    in the transaction that saves the word properties.
+
+    Parameters:
+    job (AnalysisJob object): job in the running state
+    heartbeat_interval (float): seconds between heartbeats
+
+    Returns:
+    AnalysisJob: the finished job
+    """
+    stop = threading.Event()
+
+    def heartbeat():
+        try:
+            beat(job.pk, stop, heartbeat_interval)
+        finally:
+            # the thread has a database connection of its own
+            connection.close()
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+    try:
+        analyzed = analyze_chapter(job.chapter, job=job)
+        if not analyzed:
+            job.error = 'Text could not be analyzed'
+    except Exception:
+        # the traceback goes to the log; the error is shown to API clients
+        logger.exception('Analysis job %s failed', job.pk)
+        analyzed = False
+        job.error = 'Analysis failed'
+    finally:
+        stop.set()
+        thread.join()
+
+    if not analyzed:
+        job.status = AnalysisJob.FAILED
+        job.finished_date = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_date'])
+    return job
+
+
+def requeue_stale_jobs(stale_after=STALE_JOB_MINUTES):
+    """Queue again the running jobs of workers that stopped
+
+    A job is stale when its heartbeat, or its start for jobs without
+    one, is older than stale_after minutes.
+
+    Parameters:
+    stale_after (int): minutes without a heartbeat after which a running
+    job is stale
+
+    Returns:
+    int: number of jobs queued again
+    """
+    beat_before = timezone.now() - timedelta(minutes=stale_after)
+    return AnalysisJob.objects.filter(
+        Q(heartbeat_date__lt=beat_before)
+        | Q(heartbeat_date__isnull=True, started_date__lt=beat_before),
+        status=AnalysisJob.RUNNING
+    ).update(
+        status=AnalysisJob.QUEUED,
+        started_date=None,
+        heartbeat_date=None
+    )
+
+
+def run_worker(poll_interval=1.0, once=False, stale_after=STALE_JOB_MINUTES):
+    """Process queued jobs until stopped
+
+    Stale running jobs are queued again whenever the queue is empty,
+    see requeue_stale_jobs.
+
+    Parameters:
+    poll_interval (float): seconds to sleep when the queue is empty
+    once (boolean): return when the queue is empty instead of polling
+    stale_after (int): minutes without a heartbeat after which a running
+    job is stale
+
+    Returns:
+    int: number of jobs processed
+    """
+    processed = 0
+    while True:
+        job = claim_next_job()
+        if job is None and requeue_stale_jobs(stale_after):
+            job = claim_next_job()
+        if job is None:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
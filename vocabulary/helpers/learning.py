@@ -0,0 +1,57 @@
+from django.db import connection, transaction
+
+from vocabulary.models import LearningData
+
+# rows per upsert statement; three parameters per row stay below SQLite's
+# default limit of 999 parameters
+UPSERT_BATCH_SIZE = 300
+
+
+def upsert_learning_data(user, states):
+    """Set the learned state of many words for a user
+
+    On PostgreSQL and SQLite each batch is a single INSERT ... ON CONFLICT
+    DO UPDATE against the (word, user) unique constraint. Other databases
+    insert missing rows and then update the learned flags.
+
+    Parameters:
+    user (User object): learner
+    states (dictionary): {word id: learned (boolean)}
+
+    Returns:
+    QuerySet: the LearningData rows of the given words for the user
+    """
+    items = list(states.items())
+    with transaction.atomic():
+        if connection.vendor in ('postgresql', 'sqlite'):
+            table = connection.ops.quote_name(LearningData._meta.db_table)
+            for i in range(0, len(items), UPSERT_BATCH_SIZE):
+                batch = items[i:i + UPSERT_BATCH_SIZE]
+                params = []
+                for (word_id, learned) in batch:
+                    params.extend([word_id, user.id, learned])
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'INSERT INTO {} (word_id, user_id, learned) '
+                        'VALUES {} ON CONFLICT (word_id, user_id) '
+                        'DO UPDATE SET learned = excluded.learned'.format(
+                            table, ', '.join(['(%s, %s, %s)'] * len(batch))
+                        ),
+                        params
+                    )
+        else:
+            LearningData.objects.bulk_create(
+                [
+                    LearningData(word_id=word_id, user=user, learned=learned)
+                    for (word_id, learned) in items
+                ],
+                batch_size=UPSERT_BATCH_SIZE,
+                ignore_conflicts=True
+            )
+            for learned in (True, False):
+                LearningData.objects.filter(
+                    user=user,
+                    word_id__in=[w for (w, l) in items if l is learned]
+                ).exclude(learned=learned).update(learned=learned)
+
+    return LearningData.objects.filter(user=user, word_id__in=states)
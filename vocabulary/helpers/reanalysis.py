@@ -0,0 +1,266 @@
+import difflib
+
+from django.db import transaction
+
+from vocabulary.models import AnalysisJob, WordProperties
+from vocabulary.helpers.helpers_fr_fi import PARAGRAPH_BREAK, \
+    BULK_BATCH_SIZE, LOOKUP_BATCH_SIZE, spacy_word_properties, \
+    build_word_properties, translate_words, make_word_properties, \
+    save_word_properties
+from vocabulary.helpers.chapter_cache import invalidate_chapter
+
+# the whole chapter is analyzed again when more than this share of its
+# paragraphs changed
+FULL_REANALYSIS_RATIO = 0.5
+
+
+def text_segments(title, body):
+    """Return the title and the paragraphs of a chapter, the units that
+    are compared between versions"""
+    return [title] + PARAGRAPH_BREAK.split(body)
+
+
+def changed_segments(old, new):
+    """Return the segments removed from and added to a text
+
+    Parameters:
+    old (list): segments of the previous version
+    new (list): segments of the current version
+
+    Returns:
+    tuple: list of removed segments, list of added segments
+    """
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    removed = []
+    added = []
+    for (tag, i1, i2, j1, j2) in matcher.get_opcodes():
+        if tag != 'equal':
+            removed.extend(old[i1:i2])
+            added.extend(new[j1:j2])
+    return (removed, added)
+
+
+def analyze_segments(segments, source_lang):
+    """Analyze paragraphs together, see spacy_word_properties"""
+    text = '\n\n'.join(segments)
+    if not text.strip():
+        return {}
+    return spacy_word_properties(text, source_lang)
+
+
+def reanalyze_chapter(chapter, old_title, old_body):
+    """Update the word properties of an edited chapter
+
+    See analyze_edit and apply_edit, which callers that save the chapter
+    themselves use to keep the analysis out of their transaction.
+
+    Parameters:
+    chapter (Chapter object): saved chapter with the new title and body
+    old_title (string): title before the edit
+    old_body (string): body before the edit
+
+    Returns:
+    boolean: True if the word properties are up to date, False if the
+    text could not be analyzed
+    """
+    analysis = analyze_edit(
+        chapter, old_title, old_body, chapter.title, chapter.body
+    )
+    if analysis is None:
+        return False
+    with transaction.atomic():
+        apply_edit(chapter, analysis)
+    return True
+
+
+def analyze_edit(chapter, old_title, old_body, title, body):
+    """Analyze the edit of a chapter, without writing anything
+
+    Only the paragraphs that changed are analyzed. When most of the text
+    changed, or the changed paragraphs cannot be applied as deltas (see
+    deltas_apply), the new text is analyzed from scratch.
+
+    Chapters with an unfinished analysis job are left to the worker,
+    which reads the current text.
+
+    Parameters:
+    chapter (Chapter object): saved chapter
+    old_title (string): title before the edit
+    old_body (string): body before the edit
+    title (string): title after the edit
+    body (string): body after the edit
+
+    Returns:
+    dictionary: input for apply_edit, or None if the text could not be
+    analyzed
+    """
+    old = text_segments(old_title, old_body)
+    new = text_segments(title, body)
+    (removed, added) = changed_segments(old, new)
+    if not removed and not added:
+        return {}
+
+    if AnalysisJob.objects.filter(chapter=chapter).exclude(
+            status__in=(AnalysisJob.DONE, AnalysisJob.FAILED)).exists():
+        return {}
+
+    changed_count = len(removed) + len(added)
+    if changed_count <= FULL_REANALYSIS_RATIO * (len(old) + len(new)):
+        removed_properties = analyze_segments(removed, chapter.source_lang)
+        added_properties = analyze_segments(added, chapter.source_lang)
+        if removed_properties is None or added_properties is None:
+            return None
+        if deltas_apply(chapter, removed_properties, added_properties):
+            return {
+                'removed': removed_properties,
+                'added': added_properties
+            }
+
+    wordproperties_list = build_word_properties(
+        title + ' ' + body,
+        chapter.source_lang,
+        chapter.target_lang
+    )
+    if wordproperties_list is None:
+        return None
+    return {'full': wordproperties_list}
+
+
+def apply_edit(chapter, analysis):
+    """Write the output of analyze_edit, in the caller's transaction
+
+    Parameters:
+    chapter (Chapter object): saved chapter with the new title and body
+    analysis (dictionary): output from analyze_edit
+    """
+    if 'full' in analysis:
+        chapter.wordproperties_set.all().delete()
+        save_word_properties(chapter, analysis['full'])
+    elif analysis:
+        apply_word_property_deltas(
+            chapter, analysis['removed'], analysis['added']
+        )
+
+
+def deltas_apply(chapter, removed, added):
+    """Return True if the analysis of the changed paragraphs can be
+    applied to the word properties of a chapter as deltas
+
+    make_word_properties puts the whole count of a lemma on the word
+    whose part of speech is that of the lemma in the text, and lists its
+    other words with zero frequency. A delta is exact only when it goes
+    to that counted word: the part of speech in the changed paragraphs
+    must match it. A lemma listed only with zero frequency cannot take a
+    delta either, since its count is not known.
+
+    Parameters:
+    chapter (Chapter object): saved chapter
+    removed (dictionary): analyze_text output of the removed text
+    added (dictionary): analyze_text output of the added text
+
+    Returns:
+    boolean: True if apply_word_property_deltas gives the result of a
+    full analysis
+    """
+    lemmas = list(set(removed) | set(added))
+    counted = {}
+    for i in range(0, len(lemmas), LOOKUP_BATCH_SIZE):
+        rows = chapter.wordproperties_set.filter(
+            word__lemma__in=lemmas[i:i + LOOKUP_BATCH_SIZE]
+        ).values_list('word__lemma', 'word__pos', 'frequency')
+        for (lemma, pos, frequency) in rows:
+            pos_list = counted.setdefault(lemma, [])
+            if frequency > 0:
+                pos_list.append(pos)
+
+    for (lemma, pos_list) in counted.items():
+        if len(pos_list) != 1:
+            return False
+        for word_properties in (removed, added):
+            properties = word_properties.get(lemma)
+            if properties is not None and properties['pos'] != pos_list[0]:
+                return False
+    return True
+
+
+def apply_word_property_deltas(chapter, removed, added):
+    """Apply the analysis of removed and added text to a chapter
+
+    The count of a lemma changes on its counted word, see deltas_apply,
+    which must hold. A lemma whose count drops to zero has left the text
+    and its words are removed, with those listed with zero frequency.
+    Tokens of removed paragraphs stay listed until their word goes.
+
+    Parameters:
+    chapter (Chapter object): saved chapter
+    removed (dictionary): analyze_text output of the removed text
+    added (dictionary): analyze_text output of the added text
+    """
+    deltas = {}
+    for (sign, word_properties) in ((-1, removed), (1, added)):
+        for (lemma, properties) in word_properties.items():
+            deltas[lemma] = deltas.get(lemma, 0) + sign * properties['count']
+
+    lemmas = list(deltas)
+    existing = []
+    for i in range(0, len(lemmas), LOOKUP_BATCH_SIZE):
+        existing.extend(
+            chapter.wordproperties_set.select_related('word').filter(
+                word__lemma__in=lemmas[i:i + LOOKUP_BATCH_SIZE]
+            )
+        )
+
+    by_lemma = {}
+    for wp in existing:
+        by_lemma.setdefault(wp.word.lemma, []).append(wp)
+
+    changed = []
+    deleted = []
+    for (lemma, wordproperties) in by_lemma.items():
+        delta = deltas[lemma]
+        for wp in wordproperties:
+            if wp.frequency <= 0 or delta == 0:
+                continue
+            wp.frequency += delta
+            if wp.frequency <= 0:
+                # the lemma left the text with all of its words
+                deleted.extend(w.id for w in wordproperties)
+                break
+            token_list = [t for t in wp.token.split(', ') if t]
+            for token in added.get(lemma, {}).get('orig', []):
+                if token not in token_list:
+                    token_list.append(token)
+            wp.token = ', '.join(token_list)
+            changed.append(wp)
+
+    # words new to the chapter are matched against the dictionary
+    known = set(wp.word.lemma for wp in existing)
+    new_properties = {
+        lemma: properties for (lemma, properties) in added.items()
+        if lemma not in known
+    }
+    created = []
+    if new_properties:
+        word_list = translate_words(
+            new_properties,
+            chapter.source_lang,
+            chapter.target_lang
+        )
+        present = set(
+            chapter.wordproperties_set.filter(
+                word_id__in=[w.id for w in word_list]
+            ).values_list('word_id', flat=True)
+        )
+        created = [
+            wp for wp in make_word_properties(new_properties, word_list)
+            if wp.word.id not in present
+        ]
+
+    WordProperties.objects.filter(id__in=deleted).delete()
+    WordProperties.objects.bulk_update(
+        changed,
+        ['frequency', 'token'],
+        batch_size=BULK_BATCH_SIZE
+    )
+    save_word_properties(chapter, created)
+    invalidate_chapter(chapter.pk)
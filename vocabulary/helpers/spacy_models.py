@@ -0,0 +1,142 @@
+import os
+import resource
+import threading
+import time
+
+import pkg_resources
+import spacy
+
+# spaCy model package used for each source language
+MODEL_PACKAGES = {
+    'fr': 'fr_core_news_sm',
+    'it': 'it_core_news_sm',
+}
+
+# Pipeline components that the vocabulary analysis does not need
+DEFAULT_DISABLE = ('parser', 'ner')
+
+
+def resident_memory():
+    """Return the resident set size of the current process in bytes"""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux; use it where /proc is missing
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class LoadedModel:
+    """A spaCy pipeline together with the cost of loading it"""
+
+    def __init__(self, nlp, load_time, resident_size):
+        self.nlp = nlp
+        self.load_time = load_time
+        self.resident_size = resident_size
+
+
+class ModelRegistry:
+    """Load each spaCy pipeline once per process and share it
+
+    Models are keyed by language and the set of disabled components, so
+    callers asking for the same pipeline get the same object. Loading is
+    guarded by a per-key lock: concurrent first requests for one model
+    wait for a single load, while different models load in parallel.
+    """
+
+    def __init__(self, packages=None):
+        self.packages = dict(MODEL_PACKAGES if packages is None else packages)
+        self._models = {}
+        self._versions = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(lang, disable=DEFAULT_DISABLE):
+        return (lang, tuple(sorted(disable)))
+
+    def get(self, lang, disable=DEFAULT_DISABLE):
+        """Return the loaded pipeline for a language
+
+        Parameters:
+        lang (string): language code, e.g. 'fr'
+        disable (iterable): names of pipeline components to disable
+
+        Returns:
+        Language: spaCy nlp object
+        """
+        return self.load(lang, disable).nlp
+
+    def load(self, lang, disable=DEFAULT_DISABLE):
+        """Return the LoadedModel for a language, loading it if needed"""
+        key = self.key(lang, disable)
+        loaded = self._models.get(key)
+        if loaded is not None:
+            return loaded
+
+        if lang not in self.packages:
+            raise LookupError('No spaCy model configured for %r' % lang)
+
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            loaded = self._models.get(key)
+            if loaded is None:
+                rss_before = resident_memory()
+                start = time.perf_counter()
+                nlp = spacy.load(self.packages[lang], disable=list(key[1]))
+                load_time = time.perf_counter() - start
+                resident_size = max(0, resident_memory() - rss_before)
+                loaded = LoadedModel(nlp, load_time, resident_size)
+                self._models[key] = loaded
+
+        return loaded
+
+    def version(self, lang):
+        """Return the model package and its installed version for a
+        language, read from package metadata without loading the model"""
+        package = self.packages.get(lang)
+        if package is None:
+            return None
+        version = self._versions.get(package)
+        if version is None:
+            # spacy.util has no version lookup before spaCy 2.1
+            try:
+                version = pkg_resources.get_distribution(package).version
+            except pkg_resources.DistributionNotFound:
+                version = 'unknown'
+            self._versions[package] = version
+        return '%s==%s' % (package, version)
+
+    def is_loaded(self, lang, disable=DEFAULT_DISABLE):
+        return self.key(lang, disable) in self._models
+
+    def stats(self):
+        """Return load time (seconds) and resident size (bytes) per model"""
+        return [
+            {
+                'lang': lang,
+                'disable': list(disable),
+                'package': self.packages.get(lang),
+                'load_time': loaded.load_time,
+                'resident_size': loaded.resident_size,
+            }
+            for (lang, disable), loaded in sorted(self._models.items())
+        ]
+
+    def clear(self):
+        """Forget all loaded models"""
+        with self._lock:
+            self._models.clear()
+            self._versions.clear()
+            self._locks.clear()
+
+
+registry = ModelRegistry()
+
+
+def get_model(lang, disable=DEFAULT_DISABLE):
+    """Return the process-wide pipeline for a language"""
+    return registry.get(lang, disable)
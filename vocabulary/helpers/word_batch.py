@@ -0,0 +1,175 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from vocabulary.models import Word, normalize_lemma
+from vocabulary.helpers.dictionary import bump_dictionary_version
+from vocabulary.helpers.chapter_cache import invalidate_words
+
+# rows per INSERT or UPDATE statement
+WRITE_BATCH_SIZE = 1000
+
+# Word columns written when updating words
+UPDATE_FIELDS = (
+    'lemma',
+    'normalized_lemma',
+    'translation',
+    'pos',
+    'gender',
+    'pronunciation',
+    'source_lang',
+    'target_lang',
+    'modified_date',
+    'modified_by'
+)
+
+
+class BatchConflict(Exception):
+    """The batch conflicts with words in the database"""
+
+
+def word_key(word):
+    """Return the unique key of a word"""
+    return (word.lemma, word.pos, word.gender, word.target_lang,
+            word.source_lang)
+
+
+def validate_batch(items, user, serializer_class):
+    """Validate a batch of words to create or update
+
+    Items with an `id` update that word (partially), the others create a
+    word. Each item is validated with serializer_class.
+
+    Parameters:
+    items (list): word dictionaries
+    user (User object): user writing the words
+    serializer_class (class): serializer of a word
+
+    Returns:
+    tuple: per item results, {'status': 'created' or 'updated', 'word':
+    unsaved Word object} or {'status': 'error', 'errors': dictionary};
+    and the set of language pairs of the words before the update
+    """
+    ids = []
+    for item in items:
+        if isinstance(item, dict) and item.get('id') is not None:
+            try:
+                ids.append(int(item['id']))
+            except (TypeError, ValueError):
+                pass
+    instances = Word.objects.in_bulk(ids)
+
+    results = []
+    language_pairs = set()
+    keys = set()
+    for item in items:
+        if not isinstance(item, dict):
+            results.append({
+                'status': 'error',
+                'errors': {'non_field_errors': ['Expected a word']}
+            })
+            continue
+
+        if item.get('id') is not None:
+            try:
+                instance = instances.get(int(item['id']))
+            except (TypeError, ValueError):
+                instance = None
+            if instance is None:
+                results.append({
+                    'status': 'error',
+                    'errors': {'id': ['Word not found']}
+                })
+                continue
+            language_pairs.add((instance.source_lang, instance.target_lang))
+            serializer = serializer_class(instance, data=item, partial=True)
+        else:
+            serializer = serializer_class(data=item)
+
+        if not serializer.is_valid():
+            results.append({
+                'status': 'error',
+                'errors': serializer.errors
+            })
+            continue
+
+        if serializer.instance is not None:
+            word = serializer.instance
+            for attr, value in serializer.validated_data.items():
+                setattr(word, attr, value)
+            word.modified_by = user
+            results.append({'status': 'updated', 'word': word})
+        else:
+            data = dict(serializer.validated_data)
+            data['created_by'] = user
+            word = Word(**data)
+            results.append({'status': 'created', 'word': word})
+
+        key = word_key(word)
+        if key in keys:
+            results[-1] = {
+                'status': 'error',
+                'errors': {'non_field_errors': [
+                    'The same word appears twice in the batch'
+                ]}
+            }
+        keys.add(key)
+
+    return (results, language_pairs)
+
+
+def write_batch(results, language_pairs):
+    """Write the words of a validated batch in one transaction
+
+    Parameters:
+    results (list): results from validate_batch without errors
+    language_pairs (set): language pairs from validate_batch
+
+    Raises:
+    BatchConflict: a word clashes with a row written since validation,
+    or updated words swap their unique keys; nothing is written
+    """
+    new_words = [r['word'] for r in results if r['status'] == 'created']
+    changed_words = [r['word'] for r in results if r['status'] == 'updated']
+    language_pairs = set(language_pairs)
+    now = timezone.now()
+    for word in new_words + changed_words:
+        word.normalized_lemma = normalize_lemma(word.lemma)
+        word.modified_date = now
+        language_pairs.add((word.source_lang, word.target_lang))
+
+    try:
+        with transaction.atomic():
+            Word.objects.bulk_create(new_words, batch_size=WRITE_BATCH_SIZE)
+            Word.objects.bulk_update(
+                changed_words,
+                UPDATE_FIELDS,
+                batch_size=WRITE_BATCH_SIZE
+            )
+    except IntegrityError:
+        raise BatchConflict()
+
+    fill_created_ids(new_words)
+    for (source, target) in language_pairs:
+        bump_dictionary_version(source, target)
+    invalidate_words(word.pk for word in changed_words)
+
+
+def fill_created_ids(words):
+    """Set primary keys that the database did not return from a bulk
+    insert, looking the words up by their unique key"""
+    missing = [w for w in words if w.pk is None]
+    if not missing:
+        return
+    by_key = {}
+    for w in missing:
+        by_key[word_key(w)] = w
+    queryset = Word.objects.filter(
+        lemma__in=set(w.lemma for w in missing)
+    ).values_list(
+        'id', 'lemma', 'pos', 'gender', 'target_lang', 'source_lang'
+    )
+    for (pk, *key) in queryset:
+        word = by_key.get(tuple(key))
+        if word is not None:
+            word.pk = pk
+            word._state.adding = False
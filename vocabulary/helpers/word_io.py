@@ -0,0 +1,328 @@
+import csv
+import io
+import json
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from vocabulary.models import Word, normalize_lemma
+from vocabulary.helpers.dictionary import bump_dictionary_version
+from vocabulary.helpers.chapter_cache import invalidate_words
+
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = (CSV, JSONL)
+
+# columns of exported and imported words
+WORD_FIELDS = (
+    'lemma',
+    'translation',
+    'pos',
+    'gender',
+    'pronunciation',
+    'source_lang',
+    'target_lang'
+)
+
+# number of rows upserted per transaction
+IMPORT_BATCH_SIZE = 5000
+# number of rows fetched from the database at a time when exporting
+EXPORT_CHUNK_SIZE = 5000
+
+POS_VALUES = set(pos for (pos, name) in Word.POS_CHOICES)
+GENDER_VALUES = set(gender for (gender, name) in Word.GENDER_CHOICES)
+LANGUAGE_VALUES = set(lang for (lang, name) in Word.LANGUAGE_CHOICES)
+
+
+def guess_format(filename, default=CSV):
+    """Return the file format implied by a file name"""
+    if filename and filename.lower().endswith(('.jsonl', '.json')):
+        return JSONL
+    if filename and filename.lower().endswith('.csv'):
+        return CSV
+    return default
+
+
+class Echo:
+    """File-like object that returns what is written to it"""
+    def write(self, value):
+        return value
+
+
+def export_words(queryset, format=CSV):
+    """Serialize words one line at a time
+
+    Rows are read from the database in chunks, so memory use does not
+    depend on the size of the dictionary.
+
+    Parameters:
+    queryset (QuerySet): words to export
+    format (string): 'csv' or 'jsonl'
+
+    Returns:
+    generator: lines of text, the CSV header first
+    """
+    rows = queryset.order_by('id').values_list(*WORD_FIELDS) \
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if format == JSONL:
+        for row in rows:
+            yield json.dumps(dict(zip(WORD_FIELDS, row)), ensure_ascii=False) \
+                + '\n'
+    else:
+        writer = csv.writer(Echo())
+        yield writer.writerow(WORD_FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+
+
+def read_words(lines, format=CSV):
+    """Parse lines of CSV (with a header) or JSONL into word dictionaries
+
+    Parameters:
+    lines (iterable): lines of text
+    format (string): 'csv' or 'jsonl'
+
+    Returns:
+    generator: dictionaries, or None for a line that cannot be parsed
+    """
+    if format == JSONL:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else None
+    else:
+        for row in csv.DictReader(lines):
+            yield row
+
+
+def clean_word(row):
+    """Validate an imported row
+
+    Returns:
+    dictionary: the fields of WORD_FIELDS, or None if the row is invalid
+    """
+    if row is None:
+        return None
+    word = {}
+    for field in WORD_FIELDS:
+        value = row.get(field)
+        if value is not None:
+            value = str(value).strip()
+        word[field] = value or None
+
+    if not word['lemma'] or not word['translation'] \
+            or len(word['lemma']) > 255 or len(word['translation']) > 255:
+        return None
+    if word['pos'] not in POS_VALUES \
+            or word['source_lang'] not in LANGUAGE_VALUES \
+            or word['target_lang'] not in LANGUAGE_VALUES:
+        return None
+    if word['gender'] is not None and word['gender'] not in GENDER_VALUES:
+        return None
+    if word['pronunciation'] is not None \
+            and len(word['pronunciation']) > 255:
+        return None
+    return word
+
+
+def word_key(word):
+    """Return the unique key of a word dictionary or Word object"""
+    if isinstance(word, dict):
+        return (
+            word['lemma'],
+            word['pos'],
+            word['gender'],
+            word['target_lang'],
+            word['source_lang']
+        )
+    return (
+        word.lemma,
+        word.pos,
+        word.gender,
+        word.target_lang,
+        word.source_lang
+    )
+
+
+def import_words(rows, user=None, batch_size=IMPORT_BATCH_SIZE):
+    """Insert or update words on the unique key of Word
+
+    The key is (lemma, pos, gender, target_lang, source_lang). Existing
+    words get the translation and pronunciation of the imported row.
+    Rows are processed in batches, each in one transaction; on PostgreSQL
+    a batch is loaded with COPY and merged with two set-based statements.
+    Cached public chapters that use updated words are invalidated.
+
+    Parameters:
+    rows (iterable): dictionaries, e.g. from read_words
+    user (User object): recorded as creator or modifier of the words
+    batch_size (int): number of rows per transaction
+
+    Returns:
+    dictionary: {'inserted': int, 'updated': int, 'skipped': int}
+    """
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    if connection.vendor == 'postgresql':
+        upsert = upsert_words_postgresql
+    else:
+        upsert = upsert_words
+    language_pairs = set()
+
+    def flush(batch):
+        with transaction.atomic():
+            (inserted, updated) = upsert(list(batch.values()), user)
+        counts['inserted'] += inserted
+        counts['updated'] += updated
+        counts['skipped'] += len(batch) - inserted - updated
+        batch.clear()
+
+    batch = {}
+    for row in rows:
+        word = clean_word(row)
+        if word is None:
+            counts['skipped'] += 1
+            continue
+        key = word_key(word)
+        if key in batch:
+            # a later row for the same key replaces the earlier one
+            counts['skipped'] += 1
+        batch[key] = word
+        language_pairs.add((word['source_lang'], word['target_lang']))
+        if len(batch) >= batch_size:
+            flush(batch)
+    if batch:
+        flush(batch)
+
+    for (source_lang, target_lang) in language_pairs:
+        bump_dictionary_version(source_lang, target_lang)
+    return counts
+
+
+def upsert_words(words, user=None):
+    """Upsert a batch of cleaned words with the ORM
+
+    Returns:
+    tuple: number of inserted and updated words
+    """
+    existing = {}
+    for (source_lang, target_lang) in set(
+            (w['source_lang'], w['target_lang']) for w in words):
+        queryset = Word.objects.filter(
+            source_lang=source_lang,
+            target_lang=target_lang,
+            lemma__in=set(
+                w['lemma'] for w in words
+                if w['source_lang'] == source_lang
+                and w['target_lang'] == target_lang
+            )
+        ).only(*(('id',) + WORD_FIELDS))
+        for w in queryset:
+            existing[word_key(w)] = w
+
+    now = timezone.now()
+    new_words = []
+    changed_words = []
+    for word in words:
+        current = existing.get(word_key(word))
+        if current is None:
+            new_words.append(Word(
+                normalized_lemma=normalize_lemma(word['lemma']),
+                created_by=user,
+                **word
+            ))
+        elif current.translation != word['translation'] \
+                or current.pronunciation != word['pronunciation']:
+            current.translation = word['translation']
+            current.pronunciation = word['pronunciation']
+            current.modified_date = now
+            current.modified_by = user
+            changed_words.append(current)
+
+    Word.objects.bulk_create(new_words, batch_size=1000)
+    Word.objects.bulk_update(
+        changed_words,
+        ['translation', 'pronunciation', 'modified_date', 'modified_by'],
+        batch_size=1000
+    )
+    invalidate_words(w.pk for w in changed_words)
+    return (len(new_words), len(changed_words))
+
+
+def upsert_words_postgresql(words, user=None):
+    """Upsert a batch of cleaned words with COPY on PostgreSQL
+
+    The batch is copied into a temporary table, then existing words are
+    updated and missing words inserted. Genders are compared with IS NOT
+    DISTINCT FROM because the unique constraint does not cover NULLs.
+
+    Returns:
+    tuple: number of inserted and updated words
+    """
+    table = connection.ops.quote_name(Word._meta.db_table)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for word in words:
+        writer.writerow(
+            [word[field] for field in WORD_FIELDS]
+            + [normalize_lemma(word['lemma'])]
+        )
+    buffer.seek(0)
+
+    key_match = """
+        w.lemma = i.lemma
+        AND w.pos = i.pos
+        AND w.gender IS NOT DISTINCT FROM i.gender
+        AND w.target_lang = i.target_lang
+        AND w.source_lang = i.source_lang
+    """
+    user_id = user.id if user is not None else None
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TEMPORARY TABLE word_import (
+                lemma varchar(255),
+                translation varchar(255),
+                pos varchar(5),
+                gender varchar(1),
+                pronunciation varchar(255),
+                source_lang varchar(2),
+                target_lang varchar(2),
+                normalized_lemma varchar(255)
+            ) ON COMMIT DROP
+        """)
+        cursor.copy_expert(
+            'COPY word_import FROM STDIN WITH (FORMAT csv)', buffer
+        )
+        cursor.execute("""
+            UPDATE {table} w
+            SET translation = i.translation,
+                pronunciation = i.pronunciation,
+                modified_date = now(),
+                modified_by_id = %s
+            FROM word_import i
+            WHERE {key_match}
+            AND (w.translation IS DISTINCT FROM i.translation
+                 OR w.pronunciation IS DISTINCT FROM i.pronunciation)
+            RETURNING w.id
+        """.format(table=table, key_match=key_match), [user_id])
+        updated_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("""
+            INSERT INTO {table} (
+                lemma, normalized_lemma, translation, pos, gender,
+                pronunciation, source_lang, target_lang, created_date,
+                created_by_id, modified_date
+            )
+            SELECT i.lemma, i.normalized_lemma, i.translation, i.pos,
+                i.gender, i.pronunciation, i.source_lang, i.target_lang,
+                now(), %s, now()
+            FROM word_import i
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {table} w WHERE {key_match}
+            )
+        """.format(table=table, key_match=key_match), [user_id])
+        inserted = cursor.rowcount
+    invalidate_words(updated_ids)
+    return (inserted, len(updated_ids))
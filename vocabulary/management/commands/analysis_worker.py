@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from vocabulary.helpers.jobs import run_worker, STALE_JOB_MINUTES
+
+
+class Command(BaseCommand):
+    help = 'Process queued chapter analysis jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between polls of an empty queue'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when the queue is empty'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=STALE_JOB_MINUTES,
+            help='Minutes without a heartbeat after which a running job is '
+                 'queued again'
+        )
+
+    def handle(self, *args, **options):
+        processed = run_worker(
+            poll_interval=options['interval'],
+            once=options['once'],
+            stale_after=options['stale_after']
+        )
+        self.stdout.write('Processed %d analysis jobs' % processed)
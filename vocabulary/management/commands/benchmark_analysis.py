@@ -0,0 +1,82 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vocabulary.helpers.helpers_fr_fi import count_tokens, count_token_array
+from vocabulary.helpers.spacy_models import registry
+
+# sample text repeated to the requested length when no file is given
+SAMPLE_TEXT = (
+    'Il fait beau aujourd\'hui. Les enfants jouent dans le jardin et '
+    'leurs parents les regardent depuis la terrasse. Elle a acheté de '
+    'belles pommes au marché, puis nous sommes allés voir nos amis. '
+    'Les beaux jours reviennent et les oiseaux chantent dans les arbres.'
+)
+
+
+def best_time(function, repeat):
+    """Return the fastest of repeat runs of function in seconds"""
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+class Command(BaseCommand):
+    help = 'Compare the token loop and numpy aggregation of analyze_text'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default='fr', help='Source language')
+        parser.add_argument(
+            '--file',
+            help='Text file to analyze (default: a repeated sample text)'
+        )
+        parser.add_argument(
+            '--tokens',
+            type=int,
+            default=100000,
+            help='Approximate number of tokens in the sample text'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of timed runs of each method'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            nlp = registry.get(options['source'])
+        except LookupError as e:
+            raise CommandError(str(e))
+
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                text = f.read()
+        else:
+            copies = max(options['tokens'] // len(SAMPLE_TEXT.split()), 1)
+            text = ' '.join([SAMPLE_TEXT] * copies)
+
+        # the benchmark measures aggregation, not the spacy pipeline
+        nlp.max_length = max(nlp.max_length, len(text) + 1)
+        doc = nlp(text)
+
+        loop_result = count_tokens(doc, {})
+        array_result = count_token_array(doc, {})
+        if loop_result != array_result:
+            raise CommandError('The methods disagree on the analysis')
+
+        repeat = options['repeat']
+        loop = best_time(lambda: count_tokens(doc, {}), repeat)
+        array = best_time(lambda: count_token_array(doc, {}), repeat)
+
+        self.stdout.write('%d tokens, %d lemmas' % (
+            len(doc), len(array_result)
+        ))
+        self.stdout.write('token loop: %.1f ms' % (loop * 1000))
+        self.stdout.write('numpy:      %.1f ms' % (array * 1000))
+        self.stdout.write(self.style.SUCCESS(
+            'Speedup: %.1fx' % (loop / max(array, 1e-9))
+        ))
@@ -0,0 +1,105 @@
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vocabulary.helpers.helpers_fr_fi import spacy_word_properties, \
+    fast_word_properties
+from vocabulary.management.commands.ingest_corpus import read_directory, \
+    read_jsonl
+
+
+def lemma_counts(word_properties):
+    """Return {'lemma': count} of an analyze_text output"""
+    return Counter({
+        lemma: properties['count']
+        for (lemma, properties) in word_properties.items()
+    })
+
+
+class Command(BaseCommand):
+    help = 'Report how far the fast analysis diverges from the full ' \
+           'spacy pipeline on a directory of .txt files or a JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Directory or .jsonl file')
+        parser.add_argument('--source', required=True, help='Source language')
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=20,
+            help='Number of most divergent lemmas to list'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if os.path.isdir(path):
+            reader = read_directory
+        elif os.path.isfile(path):
+            reader = read_jsonl
+        else:
+            raise CommandError('%s does not exist' % path)
+
+        source = options['source']
+        full_time = 0
+        fast_time = 0
+        count = 0
+        full_total = Counter()
+        fast_total = Counter()
+        agreed = 0
+
+        for (id, title, body) in reader(path):
+            text = title + ' ' + body
+
+            start = time.perf_counter()
+            full = spacy_word_properties(text, source)
+            full_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            fast = fast_word_properties(text, source)
+            fast_time += time.perf_counter() - start
+
+            if full is None or fast is None:
+                raise CommandError('Could not analyze %s' % id)
+
+            full = lemma_counts(full)
+            fast = lemma_counts(fast)
+            # tokens given the same lemma by both analyses
+            agreed += sum((full & fast).values())
+            full_total.update(full)
+            fast_total.update(fast)
+            count += 1
+
+        tokens = sum(full_total.values())
+        if not tokens:
+            raise CommandError('No words in %s' % path)
+
+        shared = len(set(full_total) & set(fast_total))
+        self.stdout.write('%d texts, %d tokens' % (count, tokens))
+        self.stdout.write('full: %.1f s, %.0f tokens/s' % (
+            full_time, tokens / max(full_time, 1e-9)
+        ))
+        self.stdout.write('fast: %.1f s, %.0f tokens/s' % (
+            fast_time, tokens / max(fast_time, 1e-9)
+        ))
+        self.stdout.write('Speedup: %.1fx' % (
+            full_time / max(fast_time, 1e-9)
+        ))
+        self.stdout.write('Token agreement: %.1f%%' % (100 * agreed / tokens))
+        self.stdout.write('Lemma precision: %.1f%%, recall: %.1f%%' % (
+            100 * shared / max(len(fast_total), 1),
+            100 * shared / len(full_total)
+        ))
+
+        divergence = Counter({
+            lemma: abs(full_total[lemma] - fast_total[lemma])
+            for lemma in set(full_total) | set(fast_total)
+        })
+        self.stdout.write('Most divergent lemmas (full, fast):')
+        for (lemma, difference) in divergence.most_common(options['top']):
+            if not difference:
+                break
+            self.stdout.write('  %s: %d, %d' % (
+                lemma, full_total[lemma], fast_total[lemma]
+            ))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from vocabulary.models import Word
+from vocabulary.helpers.word_io import FORMATS, export_words, guess_format
+
+
+class Command(BaseCommand):
+    help = 'Write dictionary words to a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='-',
+            help='Output file (default: standard output)'
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='File format (default: from the file extension, or csv)'
+        )
+        parser.add_argument('--source', help='Source language')
+        parser.add_argument('--target', help='Target language')
+
+    def handle(self, *args, **options):
+        queryset = Word.objects.all()
+        if options['source']:
+            queryset = queryset.filter(source_lang=options['source'])
+        if options['target']:
+            queryset = queryset.filter(target_lang=options['target'])
+
+        path = options['path']
+        format = options['format'] or guess_format(path)
+        if path == '-':
+            out = self.stdout
+            for line in export_words(queryset, format):
+                out.write(line, ending='')
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as out:
+                out.writelines(export_words(queryset, format))
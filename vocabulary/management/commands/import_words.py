@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from vocabulary.helpers.word_io import FORMATS, IMPORT_BATCH_SIZE, \
+    guess_format, import_words, read_words
+
+
+class Command(BaseCommand):
+    help = 'Insert or update dictionary words from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header) or JSONL file')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='File format (default: from the file extension)'
+        )
+        parser.add_argument(
+            '--user',
+            help='Username recorded as creator or modifier of the words'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Number of words per transaction'
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError('User %s does not exist' % options['user'])
+
+        format = options['format'] or guess_format(options['path'])
+        try:
+            with open(options['path'], encoding='utf-8', newline='') as f:
+                counts = import_words(
+                    read_words(f, format),
+                    user=user,
+                    batch_size=options['batch_size']
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Inserted %(inserted)d, updated %(updated)d, '
+            'skipped %(skipped)d words' % counts
+        ))
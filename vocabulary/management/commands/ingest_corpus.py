@@ -0,0 +1,213 @@
+import json
+import os
+import time
+from functools import partial
+from multiprocessing import Pool
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from vocabulary.models import Chapter, WordProperties, DEFAULT_TITLE
+from vocabulary.helpers.helpers_fr_fi import analyze_text, translate_words, \
+    make_word_properties, BULK_BATCH_SIZE, PIPE_BATCH_SIZE
+from vocabulary.helpers.spacy_models import registry
+
+
+def text_files(path):
+    """Return the names of the .txt files in a directory, sorted"""
+    return sorted(name for name in os.listdir(path) if name.endswith('.txt'))
+
+
+def read_directory(path):
+    """Yield (id, title, body) for each .txt file in a directory"""
+    for name in text_files(path):
+        with open(os.path.join(path, name), encoding='utf-8') as f:
+            yield (name, os.path.splitext(name)[0], f.read())
+
+
+def read_jsonl(path):
+    """Yield (id, title, body) for each {"title", "body"} line of a file"""
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                item = json.loads(line)
+                yield (
+                    str(item.get('id', number)),
+                    item.get('title') or DEFAULT_TITLE,
+                    item['body']
+                )
+
+
+def analyze_item(source_lang, item):
+    """Analyze one (id, title, body) text in a worker process
+
+    Each process loads the spacy model once through the model registry.
+
+    Returns:
+    tuple: item, number of tokens, output from analyze_text
+    """
+    doc = registry.get(source_lang)(item[1] + ' ' + item[2])
+    return (item, len(doc), analyze_text(doc))
+
+
+class Command(BaseCommand):
+    help = 'Analyze a directory of .txt files or a JSONL file into chapters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Directory or .jsonl file')
+        parser.add_argument('--source', required=True, help='Source language')
+        parser.add_argument('--target', required=True, help='Target language')
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Username of the owner of the chapters'
+        )
+        parser.add_argument('--public', action='store_true')
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Number of processes analyzing texts'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of texts saved per transaction'
+        )
+        parser.add_argument(
+            '--pipe-batch-size',
+            type=int,
+            default=PIPE_BATCH_SIZE,
+            help='Number of texts spacy processes at a time'
+        )
+        parser.add_argument(
+            '--state-file',
+            help='File recording ingested texts, used to resume an '
+                 'interrupted run (default: <path>.ingested)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if os.path.isdir(path):
+            reader = read_directory
+        elif os.path.isfile(path):
+            reader = read_jsonl
+        else:
+            raise CommandError('%s does not exist' % path)
+
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError('User %s does not exist' % options['user'])
+
+        try:
+            nlp = registry.get(options['source'])
+        except LookupError as e:
+            raise CommandError(str(e))
+
+        state_file = options['state_file'] \
+            or path.rstrip(os.sep) + '.ingested'
+        done = set()
+        if os.path.exists(state_file):
+            with open(state_file, encoding='utf-8') as f:
+                done = set(line.rstrip('\n') for line in f)
+
+        if reader is read_directory:
+            # file names are the ids, so the files need not be read
+            total = sum(1 for name in text_files(path) if name not in done)
+        else:
+            total = sum(1 for item in reader(path) if item[0] not in done)
+        self.stdout.write('%d texts to ingest, %d already done' % (
+            total, len(done)
+        ))
+
+        self.options = options
+        self.user = user
+        self.count = 0
+        self.tokens = 0
+        self.total = total
+        self.start = time.perf_counter()
+
+        items = (item for item in reader(path) if item[0] not in done)
+        if options['processes'] > 1:
+            # worker processes must not share the database connections
+            connections.close_all()
+            pool = Pool(options['processes'])
+            analyzed = pool.imap(
+                partial(analyze_item, options['source']),
+                items,
+                chunksize=options['pipe_batch_size']
+            )
+        else:
+            pool = None
+            texts = ((item[1] + ' ' + item[2], item) for item in items)
+            analyzed = (
+                (item, len(doc), analyze_text(doc))
+                for doc, item in nlp.pipe(
+                    texts,
+                    batch_size=options['pipe_batch_size'],
+                    as_tuples=True
+                )
+            )
+
+        batch = []
+        try:
+            with open(state_file, 'a', encoding='utf-8') as state:
+                for result in analyzed:
+                    batch.append(result)
+                    if len(batch) >= options['batch_size']:
+                        self.save_batch(batch, state)
+                        batch = []
+                if batch:
+                    self.save_batch(batch, state)
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Ingested %d texts: %s' % (self.count, self.throughput())
+        ))
+
+    def save_batch(self, batch, state):
+        """Save chapters and word properties of analyzed texts"""
+        source = self.options['source']
+        target = self.options['target']
+        wordproperties_list = []
+
+        with transaction.atomic():
+            for ((id, title, body), tokens, word_properties) in batch:
+                chapter = Chapter.objects.create(
+                    title=title[:255],
+                    body=body,
+                    source_lang=source,
+                    target_lang=target,
+                    public=self.options['public'],
+                    created_by=self.user
+                )
+                word_list = translate_words(word_properties, source, target)
+                for wp in make_word_properties(word_properties, word_list):
+                    wp.chapter = chapter
+                    wordproperties_list.append(wp)
+            WordProperties.objects.bulk_create(
+                wordproperties_list,
+                batch_size=BULK_BATCH_SIZE
+            )
+
+        # record progress only after the batch is committed
+        for ((id, title, body), tokens, word_properties) in batch:
+            state.write(id + '\n')
+            self.tokens += tokens
+        state.flush()
+
+        self.count += len(batch)
+        self.stdout.write('%d/%d texts, %s' % (
+            self.count, self.total, self.throughput()
+        ))
+
+    def throughput(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return '%.1f texts/s, %.0f tokens/s' % (
+            self.count / elapsed, self.tokens / elapsed
+        )
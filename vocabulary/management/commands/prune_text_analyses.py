@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from vocabulary.helpers.helpers_fr_fi import prune_text_analyses, \
+    TEXT_ANALYSIS_MAX_AGE_DAYS
+
+
+class Command(BaseCommand):
+    help = 'Delete stored text analyses older than a number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=TEXT_ANALYSIS_MAX_AGE_DAYS,
+            help='Age in days of the oldest analysis kept'
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_text_analyses(options['days'])
+        self.stdout.write('Deleted %d text analyses' % deleted)
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-17 16:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocabulary', '0004_auto_20190903_1303'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=7)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('started_date', models.DateTimeField(null=True)),
+                ('finished_date', models.DateTimeField(null=True)),
+                ('chapter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='vocabulary.Chapter')),
+            ],
+            options={
+                'ordering': ['created_date', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='analysisjob',
+            index=models.Index(fields=['status', 'created_date'], name='vocabulary__status_38fee4_idx'),
+        ),
+    ]
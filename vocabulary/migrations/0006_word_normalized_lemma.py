@@ -0,0 +1,42 @@
+# Generated by Django 2.2.28 on 2026-10-17 16:09
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def populate_normalized_lemma(apps, schema_editor):
+    """Fill in normalized_lemma for existing words in batches"""
+    Word = apps.get_model('vocabulary', 'Word')
+    batch = []
+    for word in Word.objects.only('id', 'lemma').iterator(chunk_size=2000):
+        word.normalized_lemma = unicodedata.normalize('NFC', word.lemma).lower()
+        batch.append(word)
+        if len(batch) >= 2000:
+            Word.objects.bulk_update(batch, ['normalized_lemma'])
+            batch = []
+    if batch:
+        Word.objects.bulk_update(batch, ['normalized_lemma'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocabulary', '0005_analysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='word',
+            name='normalized_lemma',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(
+            populate_normalized_lemma,
+            migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='word',
+            index=models.Index(fields=['source_lang', 'target_lang', 'normalized_lemma'], name='word_lang_lemma_prefix_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+    ]
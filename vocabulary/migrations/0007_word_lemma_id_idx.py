@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-17 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocabulary', '0006_word_normalized_lemma'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='word',
+            index=models.Index(fields=['normalized_lemma', 'id'], name='word_lemma_id_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.28 on 2026-10-17 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocabulary', '0007_word_lemma_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextAnalysis',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('source_lang', models.CharField(max_length=2)),
+                ('target_lang', models.CharField(max_length=2)),
+                ('model_version', models.CharField(max_length=100)),
+                ('word_properties', models.TextField()),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Text Analyses',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='textanalysis',
+            index=models.Index(fields=['created_date'], name='vocabulary__created_198f79_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-17 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocabulary', '0008_textanalysis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='heartbeat_date',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
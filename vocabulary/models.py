@@ -1,7 +1,16 @@
+import unicodedata
+
 from django.db import models
 from django.contrib.auth.models import User
 
 DEFAULT_TITLE = 'Teksti'
+SUMMARY_LENGTH = 100
+
+
+def normalize_lemma(lemma):
+    """Return the key used for case-insensitive lemma lookups"""
+    return unicodedata.normalize('NFC', lemma).lower()
+
 
 class Word(models.Model):
     """Word with its translation and some linguistic properties"""
@@ -68,6 +77,10 @@ class Word(models.Model):
         (ENGLISH, 'English'),
     )
     lemma = models.CharField(max_length=255)
+    # lower-cased, NFC-normalized lemma, kept in sync by save()
+    normalized_lemma = models.CharField(
+        max_length=255, default='', editable=False
+    )
     translation = models.CharField(max_length=255)
     pos = models.CharField(
         max_length=5, choices=POS_CHOICES, verbose_name='Part-of-speech'
@@ -104,10 +117,31 @@ class Word(models.Model):
             'target_lang',
             'source_lang'
         ]
+        indexes = [
+            # serves equality and prefix (LIKE 'abc%') searches on
+            # PostgreSQL regardless of the database collation
+            models.Index(
+                fields=['source_lang', 'target_lang', 'normalized_lemma'],
+                name='word_lang_lemma_prefix_idx',
+                opclasses=['varchar_pattern_ops'] * 3
+            ),
+            # keyset pagination of the word list
+            models.Index(
+                fields=['normalized_lemma', 'id'],
+                name='word_lemma_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.lemma + ' (' + self.pos + ') -> ' + self.translation
 
+    def save(self, *args, **kwargs):
+        self.normalized_lemma = normalize_lemma(self.lemma)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'lemma' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'normalized_lemma'}
+        super().save(*args, **kwargs)
+
 
 class Chapter(models.Model):
     """Analyzed text"""
@@ -155,7 +189,7 @@ class Chapter(models.Model):
         return self.title + ': ' + self.body[:50] + '...'
 
     def summary(self):
-        return self.body[:100]
+        return self.body[:SUMMARY_LENGTH]
 
 
 class WordProperties(models.Model):
@@ -179,3 +213,61 @@ class LearningData(models.Model):
         verbose_name_plural = 'Learning Data'
         ordering = ['word']
         unique_together = ['word', 'user']
+
+
+class AnalysisJob(models.Model):
+    """Queued analysis of a chapter, processed by the analysis worker"""
+    # Status choices
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    chapter = models.ForeignKey('Chapter', on_delete=models.CASCADE)
+    status = models.CharField(
+        max_length=7, choices=STATUS_CHOICES, default=QUEUED
+    )
+    error = models.TextField(default='', blank=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+    started_date = models.DateTimeField(null=True)
+    # refreshed by the worker while the job runs
+    heartbeat_date = models.DateTimeField(null=True)
+    finished_date = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['created_date', 'id']
+        indexes = [models.Index(fields=['status', 'created_date'])]
+
+    def __str__(self):
+        return 'Analysis of chapter ' + str(self.chapter_id) + ': ' \
+            + self.status
+
+
+class TextAnalysis(models.Model):
+    """Stored analysis of a text, reused for identical texts
+
+    The hash covers the normalized text, the languages and the spaCy model
+    version; word_properties is the JSON output of analyze_text.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    source_lang = models.CharField(max_length=2)
+    target_lang = models.CharField(max_length=2)
+    model_version = models.CharField(max_length=100)
+    word_properties = models.TextField()
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'Text Analyses'
+        # old analyses are pruned by created_date
+        indexes = [models.Index(fields=['created_date'])]
+
+    def __str__(self):
+        return self.content_hash + ' (' + self.source_lang + ' -> ' \
+            + self.target_lang + ')'
@@ -0,0 +1,47 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from vocabulary.models import Word, Chapter, WordProperties
+from vocabulary.helpers.dictionary import bump_dictionary_version
+from vocabulary.helpers import chapter_cache
+
+
+@receiver(post_save, sender=Word)
+@receiver(post_delete, sender=Word)
+def word_changed(sender, instance, **kwargs):
+    """Invalidate dictionary snapshots of the word's language pair"""
+    bump_dictionary_version(instance.source_lang, instance.target_lang)
+
+
+@receiver(post_save, sender=Word)
+def word_saved(sender, instance, created, **kwargs):
+    """Invalidate cached public chapters that use an edited word"""
+    if not created:
+        chapter_cache.invalidate_words([instance.pk])
+
+
+@receiver(pre_delete, sender=Word)
+def word_deleted(sender, instance, **kwargs):
+    """Invalidate cached public chapters that use a deleted word, while
+    its word properties still exist"""
+    chapter_cache.invalidate_words([instance.pk])
+
+
+@receiver(post_save, sender=Chapter)
+@receiver(post_delete, sender=Chapter)
+def chapter_changed(sender, instance, **kwargs):
+    """Invalidate the cached payloads of the chapter"""
+    chapter_cache.invalidate_chapter(instance.pk)
+
+
+# Word properties have no delete receiver, so that cascading deletes of
+# chapters and words do not load every row. Code that deletes word
+# properties invalidates their chapter once, see invalidate_chapter
+@receiver(post_save, sender=WordProperties)
+def wordproperties_saved(sender, instance, **kwargs):
+    """Mark the chapter of edited word properties as modified"""
+    Chapter.objects.filter(pk=instance.chapter_id).update(
+        modified_date=timezone.now()
+    )
+    chapter_cache.invalidate_chapter(instance.chapter_id)
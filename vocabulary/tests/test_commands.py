@@ -0,0 +1,177 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from vocabulary.helpers.dictionary import snapshots
+from vocabulary.models import Chapter, WordProperties, TextAnalysis
+from vocabulary.tests.test_helpers import Token, Doc
+from vocabulary.tests.test_models import create_word, SOURCE, TARGET
+
+
+class Pipeline:
+    """Pipeline that lemmatizes every word as itself"""
+    def pipe(self, texts, batch_size, as_tuples=False):
+        for text, context in texts:
+            yield (self(text), context)
+
+    def __call__(self, text):
+        return [Token(w, w.isalpha(), 'NOUN', w.lower()) for w in text.split()]
+
+
+@patch('vocabulary.management.commands.ingest_corpus.registry')
+class IngestCorpusTests(TestCase):
+
+    def setUp(self):
+        snapshots.clear()
+        self.user = get_user_model().objects.create_user(
+            'testuser',
+            'testpass'
+        )
+        create_word(user=self.user, lemma='chat', translation='kissa')
+        create_word(user=self.user, lemma='chien', translation='koira')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'corpus.jsonl')
+        with open(self.path, 'w') as f:
+            for i, body in enumerate(['chat chat', 'chien', 'chat chien']):
+                f.write(json.dumps({'title': 'T%d' % i, 'body': body}) + '\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def ingest(self, **options):
+        out = StringIO()
+        call_command(
+            'ingest_corpus', self.path,
+            source=SOURCE, target=TARGET, user='testuser', batch_size=2,
+            stdout=out, **options
+        )
+        return out.getvalue()
+
+    def test_ingest_jsonl(self, registry):
+        """Test that texts become analyzed chapters"""
+        registry.get.return_value = Pipeline()
+
+        output = self.ingest()
+
+        self.assertEqual(Chapter.objects.count(), 3)
+        chapter = Chapter.objects.get(title='T0')
+        wp = WordProperties.objects.get(chapter=chapter)
+        self.assertEqual((wp.word.lemma, wp.frequency), ('chat', 2))
+        self.assertEqual(
+            WordProperties.objects.filter(chapter__title='T2').count(), 2
+        )
+        self.assertIn('Ingested 3 texts', output)
+        self.assertIn('tokens/s', output)
+
+    def test_ingest_processes(self, registry):
+        """Test analyzing texts in several processes"""
+        registry.get.return_value = Pipeline()
+
+        self.ingest(processes=2)
+
+        self.assertEqual(Chapter.objects.count(), 3)
+        wp = WordProperties.objects.get(chapter__title='T0')
+        self.assertEqual((wp.word.lemma, wp.frequency), ('chat', 2))
+
+    def test_resume(self, registry):
+        """Test that a second run skips texts that were ingested"""
+        registry.get.return_value = Pipeline()
+        self.ingest()
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'title': 'T3', 'body': 'chien'}) + '\n')
+
+        output = self.ingest()
+
+        self.assertEqual(Chapter.objects.count(), 4)
+        self.assertIn('1 texts to ingest, 3 already done', output)
+
+
+class BenchmarkAnalysisTests(TestCase):
+
+    @patch('vocabulary.management.commands.benchmark_analysis.registry')
+    def test_benchmark(self, registry):
+        """Test that both methods are timed on the same analysis"""
+        class Nlp:
+            max_length = 1000000
+
+            def __call__(self, text):
+                return Doc([
+                    Token(w, w.isalpha(), 'NOUN', w.lower().rstrip('s'))
+                    for w in text.split()
+                ])
+
+        registry.get.return_value = Nlp()
+        out = StringIO()
+
+        call_command(
+            'benchmark_analysis', tokens=200, repeat=1, stdout=out
+        )
+
+        self.assertIn('token loop', out.getvalue())
+        self.assertIn('Speedup', out.getvalue())
+
+
+class CompareAnalysisTests(TestCase):
+
+    @patch('vocabulary.management.commands.compare_analysis'
+           '.fast_word_properties')
+    @patch('vocabulary.management.commands.compare_analysis'
+           '.spacy_word_properties')
+    def test_compare(self, spacy_word_properties, fast_word_properties):
+        """Test that the report counts the tokens lemmatized alike"""
+        spacy_word_properties.return_value = {
+            'être': {'orig': ['est'], 'pos': 'AUX', 'count': 2},
+            'chat': {'pos': 'NOUN', 'count': 2},
+        }
+        fast_word_properties.return_value = {
+            'est': {'pos': '', 'count': 2},
+            'chat': {'pos': '', 'count': 2},
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'corpus.jsonl')
+            with open(path, 'w') as f:
+                f.write(json.dumps({'body': 'Le chat est un chat.'}) + '\n')
+            out = StringIO()
+
+            call_command('compare_analysis', path, source=SOURCE, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('1 texts, 4 tokens', output)
+        self.assertIn('Token agreement: 50.0%', output)
+        self.assertIn('Lemma precision: 50.0%, recall: 50.0%', output)
+        self.assertIn('être: 2, 0', output)
+
+
+class PruneTextAnalysesTests(TestCase):
+
+    def test_prune(self):
+        """Test that only analyses older than the given days are deleted"""
+        for (content_hash, days) in (('old', 40), ('new', 10)):
+            analysis = TextAnalysis.objects.create(
+                content_hash=content_hash,
+                source_lang=SOURCE,
+                target_lang=TARGET,
+                model_version='1',
+                word_properties='{}'
+            )
+            # created_date is set on insert, so backdate it afterwards
+            TextAnalysis.objects.filter(pk=analysis.pk).update(
+                created_date=timezone.now() - timedelta(days=days)
+            )
+        out = StringIO()
+
+        call_command('prune_text_analyses', days=30, stdout=out)
+
+        self.assertEqual(
+            list(TextAnalysis.objects.values_list('content_hash', flat=True)),
+            ['new']
+        )
+        self.assertIn('Deleted 1 text analyses', out.getvalue())
@@ -0,0 +1,102 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from vocabulary.helpers import helpers_fr_fi
+from vocabulary.helpers.dictionary import DictionarySnapshot, snapshots
+from vocabulary.tests.test_models import create_word, SOURCE, TARGET
+
+
+class DictionarySnapshotTests(TestCase):
+
+    def setUp(self):
+        snapshots.clear()
+        self.user = get_user_model().objects.create_user(
+            'testuser',
+            'testpass'
+        )
+        self.petit = create_word(
+            user=self.user, lemma='petit', translation='pieni', pos='ADJ'
+        )
+        self.table = create_word(
+            user=self.user, lemma='Table', translation='pöytä', pos='NOUN'
+        )
+        create_word(
+            user=self.user, lemma='table', translation='taulukko',
+            pos='NOUN', source_lang='fr', target_lang='en'
+        )
+
+    def test_build_snapshot(self):
+        """Test that a snapshot holds one language pair"""
+        snapshot = DictionarySnapshot.build(SOURCE, TARGET)
+
+        self.assertEqual(len(snapshot), 2)
+        self.assertEqual(snapshot.lookup('TABLE'), [self.table])
+        self.assertEqual(snapshot.lookup('table')[0].translation, 'pöytä')
+        self.assertEqual(snapshot.lookup('asdf'), [])
+
+    def test_find_words_without_queries(self):
+        """Test that lookups on a built snapshot run no SQL"""
+        snapshot = snapshots.get(SOURCE, TARGET)
+
+        with self.assertNumQueries(0):
+            found = snapshot.find_words(['petit', 'table', 'asdf'])
+            self.assertEqual(found['petit'][0].lemma, 'petit')
+            self.assertEqual(found['table'][0].pos, 'NOUN')
+
+        self.assertEqual(found, {'petit': [self.petit], 'table': [self.table]})
+
+    def test_snapshot_reused(self):
+        """Test that the snapshot is built once per version"""
+        snapshot = snapshots.get(SOURCE, TARGET)
+
+        with self.assertNumQueries(0):
+            self.assertIs(snapshots.get(SOURCE, TARGET), snapshot)
+
+    def test_snapshot_rebuilt_on_change(self):
+        """Test that saving or deleting a word refreshes the snapshot"""
+        snapshot = snapshots.get(SOURCE, TARGET)
+
+        chaise = create_word(
+            user=self.user, lemma='chaise', translation='tuoli'
+        )
+        self.assertIsNot(snapshots.get(SOURCE, TARGET), snapshot)
+        self.assertEqual(snapshots.get(SOURCE, TARGET).lookup('chaise'),
+                         [chaise])
+
+        chaise.delete()
+        self.assertEqual(snapshots.get(SOURCE, TARGET).lookup('chaise'), [])
+
+    def test_translate_words_uses_snapshot(self):
+        """Test that dictionary matching runs without SQL"""
+        snapshots.get(SOURCE, TARGET)
+        worddict = {
+            'petit': {'pos': 'ADJ'},
+            'tables': {'pos': 'NOUN', 'orig': ['table']}
+        }
+
+        with self.assertNumQueries(0):
+            word_list = helpers_fr_fi.translate_words(worddict, SOURCE, TARGET)
+
+        self.assertEqual(word_list, [self.petit, self.table])
+
+    def test_complete_prefix(self):
+        """Test prefix completion in lemma order"""
+        create_word(user=self.user, lemma='petite', translation='pieni')
+        create_word(user=self.user, lemma='pas', translation='askel')
+        snapshot = snapshots.get(SOURCE, TARGET)
+
+        self.assertEqual(
+            [w['lemma'] for w in snapshot.complete('PET')],
+            ['petit', 'petite']
+        )
+        self.assertEqual(
+            [w['lemma'] for w in snapshot.complete('p', limit=2)],
+            ['pas', 'petit']
+        )
+        self.assertEqual(snapshot.complete('x'), [])
+        self.assertEqual(snapshot.complete('ta')[0], {
+            'id': self.table.id,
+            'lemma': 'Table',
+            'translation': 'pöytä',
+            'pos': 'NOUN'
+        })
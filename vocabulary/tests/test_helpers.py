@@ -1,14 +1,61 @@
-from django.test import TestCase
+from unittest.mock import patch
+
+import numpy
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 
 from vocabulary.helpers import helpers_fr_fi
-from vocabulary.models import Word, Chapter, WordProperties
+from vocabulary.helpers.dictionary import snapshots
+from vocabulary.models import Word, Chapter, WordProperties, TextAnalysis
 from vocabulary.tests.test_models import create_word, SOURCE, TARGET
 
 
+class Token:
+    """Minimal stand-in for a spacy token"""
+    def __init__(self, text, is_alpha, pos_, lemma_):
+        self.text = text
+        self.is_alpha = is_alpha
+        self.pos_ = pos_
+        self.lemma_ = lemma_
+
+
+class Doc:
+    """Minimal stand-in for a spacy Doc that supports to_array"""
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.vocab = self
+        self.strings = {}
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def hash(self, string):
+        key = len(self.strings) + 1
+        for (k, v) in self.strings.items():
+            if v == string:
+                key = k
+        self.strings[key] = string
+        return key
+
+    def to_array(self, attrs):
+        return numpy.array([
+            [
+                self.hash(t.lemma_),
+                self.hash(t.pos_),
+                int(t.is_alpha),
+                self.hash(t.text.lower())
+            ]
+            for t in self.tokens
+        ], dtype='uint64').reshape(-1, len(attrs))
+
+
 class HelperTests(TestCase):
 
     def setUp(self):
+        snapshots.clear()
         self.user = get_user_model().objects.create_user(
             'testuser',
             'testpass'
@@ -40,6 +87,30 @@ class HelperTests(TestCase):
 
         self.assertEqual(test_dict, dict)
 
+    def test_analyze_text_array(self):
+        """Test that a Doc is counted like its tokens one by one"""
+        tokens = [
+            Token('Belle', True, 'ADJ', 'beau'),
+            Token('maison', True, 'NOUN', 'maison'),
+            Token(',', False, 'PUNCT', ','),
+            Token('beau', True, 'VERB', 'Beau'),
+            Token('Maisons', True, 'NOUN', 'maison'),
+            Token('beaux', True, 'ADJ', 'beau'),
+            Token('belle', True, 'ADJ', 'beau'),
+            Token('Il', True, 'PRON', 'il'),
+        ]
+
+        worddict = helpers_fr_fi.analyze_text(Doc(tokens))
+
+        self.assertEqual(worddict, helpers_fr_fi.analyze_text(tokens))
+        self.assertEqual(worddict['beau'], {
+            'pos': 'ADJ', 'count': 4, 'orig': ['belle', 'beaux']
+        })
+        self.assertEqual(
+            list(worddict), list(helpers_fr_fi.analyze_text(tokens))
+        )
+        self.assertEqual(helpers_fr_fi.analyze_text(Doc([])), {})
+
     def test_translate_words(self):
         """Test getting translations for words"""
         create_word(
@@ -65,3 +136,211 @@ class HelperTests(TestCase):
         word_list.sort(key=lambda x: x.lemma)
 
         self.assertSequenceEqual(test_word_list, word_list)
+
+    def test_translate_words_by_token(self):
+        """Test that untranslated lemmas are looked up by their token"""
+        create_word(
+            user=self.user, lemma='belle', translation='kaunis', pos='ADJ'
+        )
+        create_word(
+            user=self.user, lemma='dormir', translation='nukkua', pos='VERB'
+        )
+        dict = {'beau': {'pos': 'ADJ', 'orig': ['belle', 'beaux']},
+                    'dort': {'pos': 'VERB', 'orig': ['dort']},
+                    'Dormir': {'pos': 'VERB'}
+                }
+        word_list = helpers_fr_fi.translate_words(
+            dict, SOURCE, TARGET
+        )
+
+        self.assertEqual(
+            [w.lemma for w in word_list],
+            ['belle', 'dormir']
+        )
+
+    @override_settings(DICTIONARY_SNAPSHOT=False)
+    def test_translate_words_query_count(self):
+        """Test that the number of queries does not grow with the text"""
+        for i in range(20):
+            create_word(
+                user=self.user, lemma='mot%d' % i, translation='sana'
+            )
+
+        def worddict(size):
+            words = {}
+            for i in range(size):
+                # every other lemma misses and falls back to its token
+                if i % 2:
+                    words['lemme%d' % i] = {
+                        'pos': 'NOUN', 'orig': ['mot%d' % (i % 20)]
+                    }
+                else:
+                    words['mot%d' % (i % 20)] = {'pos': 'NOUN'}
+            return words
+
+        with self.assertNumQueries(2):
+            small = helpers_fr_fi.translate_words(worddict(10), SOURCE, TARGET)
+        with self.assertNumQueries(2):
+            large = helpers_fr_fi.translate_words(
+                worddict(400), SOURCE, TARGET
+            )
+
+        self.assertEqual(len(small), 10)
+        self.assertEqual(len(large), 210)
+
+    @patch('vocabulary.helpers.helpers_fr_fi.spacy_analyze')
+    def test_save_chapter(self, spacy_analyze):
+        """Test saving a chapter with its word properties in bulk"""
+        create_word(
+            user=self.user, lemma='beau', translation='kaunis', pos='ADJ'
+        )
+        create_word(
+            user=self.user, lemma='faire', translation='tehdä', pos='VERB'
+        )
+        spacy_analyze.return_value = [
+            Token('Il', True, 'PRON', 'il'),
+            Token('fait', True, 'VERB', 'faire'),
+            Token('beau', True, 'ADJ', 'beau'),
+            Token('belle', True, 'ADJ', 'beau'),
+        ]
+
+        # a lookup of the stored analysis and storing the new one, one
+        # query to build the dictionary snapshot, then the chapter and all
+        # word properties in one transaction
+        with self.assertNumQueries(7):
+            (chapter, analyzed) = helpers_fr_fi.save_chapter(
+                'Il fait beau.', SOURCE, TARGET, 'Titre', user=self.user
+            )
+
+        self.assertTrue(analyzed)
+        wps = {
+            wp.word.lemma: wp
+            for wp in WordProperties.objects.filter(chapter=chapter)
+        }
+        self.assertEqual(set(wps), {'beau', 'faire'})
+        self.assertEqual(wps['beau'].frequency, 2)
+        self.assertEqual(wps['beau'].token, 'belle')
+        self.assertEqual(wps['faire'].token, 'fait')
+
+    @patch('vocabulary.helpers.helpers_fr_fi.spacy_analyze')
+    def test_save_chapter_reuses_analysis(self, spacy_analyze):
+        """Test that an identical text is not analyzed again"""
+        create_word(
+            user=self.user, lemma='beau', translation='kaunis', pos='ADJ'
+        )
+        spacy_analyze.return_value = [
+            Token('beau', True, 'ADJ', 'beau'),
+            Token('belle', True, 'ADJ', 'beau'),
+        ]
+
+        (first, analyzed) = helpers_fr_fi.save_chapter(
+            'Il fait beau.', SOURCE, TARGET, 'Titre', user=self.user
+        )
+        (second, analyzed) = helpers_fr_fi.save_chapter(
+            'Il  fait\nbeau.', SOURCE, TARGET, 'Titre', user=self.user
+        )
+
+        self.assertTrue(analyzed)
+        self.assertEqual(spacy_analyze.call_count, 1)
+        self.assertEqual(TextAnalysis.objects.count(), 1)
+        self.assertEqual(
+            list(second.wordproperties_set.values_list(
+                'word', 'token', 'frequency'
+            )),
+            list(first.wordproperties_set.values_list(
+                'word', 'token', 'frequency'
+            ))
+        )
+
+        helpers_fr_fi.save_chapter(
+            'Il fait beau.', SOURCE, 'en', 'Titre', user=self.user
+        )
+        self.assertEqual(spacy_analyze.call_count, 2)
+
+    @patch('vocabulary.helpers.helpers_fr_fi.spacy_analyze')
+    def test_save_chapter_not_analyzed(self, spacy_analyze):
+        """Test that no chapter is saved if the text is not analyzed"""
+        spacy_analyze.return_value = None
+
+        (chapter, analyzed) = helpers_fr_fi.save_chapter(
+            'Il fait beau.', SOURCE, TARGET, 'Titre', user=self.user
+        )
+
+        self.assertFalse(analyzed)
+        self.assertFalse(Chapter.objects.exists())
+
+    @patch('vocabulary.helpers.helpers_fr_fi.save_word_properties')
+    @patch('vocabulary.helpers.helpers_fr_fi.spacy_analyze')
+    def test_save_chapter_atomic(self, spacy_analyze, save_word_properties):
+        """Test that a failed insert leaves no half-saved chapter"""
+        spacy_analyze.return_value = [Token('beau', True, 'ADJ', 'beau')]
+        save_word_properties.side_effect = RuntimeError('insert failed')
+
+        with self.assertRaises(RuntimeError):
+            helpers_fr_fi.save_chapter(
+                'Il fait beau.', SOURCE, TARGET, 'Titre', user=self.user
+            )
+
+        self.assertFalse(Chapter.objects.exists())
+
+    def test_split_text(self):
+        """Test splitting text on paragraph and sentence boundaries"""
+        text = 'Il fait beau. Le soleil brille.\n\nJe dors.\n\n' \
+            + 'Une très longue phrase sans fin ' * 3
+
+        chunks = list(helpers_fr_fi.split_text(text, chunk_size=40))
+
+        self.assertTrue(all(len(chunk) <= 40 for chunk in chunks))
+        self.assertEqual(chunks[0], 'Il fait beau. Le soleil brille.')
+        self.assertEqual(' '.join(chunks).split(), text.split())
+
+    @patch('vocabulary.helpers.helpers_fr_fi.registry')
+    def test_build_word_properties_streaming(self, registry):
+        """Test that long texts are analyzed in chunks with nlp.pipe"""
+        class Pipeline:
+            def pipe(self, texts, batch_size):
+                for text in texts:
+                    yield [
+                        Token(w, True, 'ADJ', 'beau')
+                        for w in text.split()
+                    ]
+
+        registry.packages = {'fr': 'fr_test_model'}
+        registry.get.return_value = Pipeline()
+        create_word(
+            user=self.user, lemma='beau', translation='kaunis', pos='ADJ'
+        )
+        text = 'belle beaux\n\n' * (helpers_fr_fi.STREAMING_THRESHOLD // 10)
+
+        wordproperties_list = helpers_fr_fi.build_word_properties(
+            text, SOURCE, TARGET
+        )
+
+        self.assertEqual(len(wordproperties_list), 1)
+        self.assertEqual(wordproperties_list[0].frequency, len(text.split()))
+        self.assertEqual(wordproperties_list[0].token, 'belle, beaux')
+
+    @patch('vocabulary.helpers.helpers_fr_fi.registry')
+    def test_preview_fast(self, registry):
+        """Test that the fast preview counts words whatever their tag"""
+        class Pipeline:
+            def make_doc(self, text):
+                return [
+                    Token(w, True, '', w.rstrip('s')) for w in text.split()
+                ]
+
+        registry.packages = {'fr': 'fr_test_model'}
+        registry.get.return_value = Pipeline()
+        create_word(
+            user=self.user, lemma='chat', translation='kissa', pos='NOUN'
+        )
+
+        wordproperties_list = helpers_fr_fi.preview_word_properties(
+            'chat chats chien', SOURCE, TARGET, fast=True
+        )
+
+        self.assertEqual(len(wordproperties_list), 1)
+        self.assertEqual(wordproperties_list[0].word.lemma, 'chat')
+        self.assertEqual(wordproperties_list[0].frequency, 2)
+        self.assertEqual(wordproperties_list[0].token, 'chats')
+        self.assertFalse(WordProperties.objects.exists())
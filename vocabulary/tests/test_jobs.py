@@ -0,0 +1,116 @@
+from datetime import timedelta
+from unittest.mock import patch, Mock
+
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from vocabulary.helpers import jobs
+from vocabulary.models import Chapter, AnalysisJob, WordProperties
+from vocabulary.tests.test_models import create_word
+
+
+class AnalysisJobTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'testuser',
+            'testpass'
+        )
+        self.chapter = Chapter.objects.create(
+            title='Test',
+            body='Il fait beau.',
+            source_lang='fr',
+            target_lang='fi',
+            created_by=self.user
+        )
+        self.word = create_word(user=self.user, lemma='beau')
+
+    def test_claim_next_job(self):
+        """Test that the oldest queued job is claimed once"""
+        job1 = jobs.enqueue_analysis(self.chapter)
+        job2 = jobs.enqueue_analysis(self.chapter)
+
+        claimed = jobs.claim_next_job()
+        job1.refresh_from_db()
+
+        self.assertEqual(claimed, job1)
+        self.assertEqual(job1.status, AnalysisJob.RUNNING)
+        self.assertIsNotNone(job1.started_date)
+        self.assertEqual(jobs.claim_next_job(), job2)
+        self.assertIsNone(jobs.claim_next_job())
+
+    @patch('vocabulary.helpers.helpers_fr_fi.build_word_properties')
+    def test_run_worker_once(self, build_word_properties):
+        """Test that the worker processes the queue and marks jobs done"""
+        build_word_properties.side_effect = lambda *args: [
+            WordProperties(word=self.word, frequency=1)
+        ]
+        job = jobs.enqueue_analysis(self.chapter)
+
+        processed = jobs.run_worker(once=True)
+        job.refresh_from_db()
+
+        self.assertEqual(processed, 1)
+        self.assertEqual(job.status, AnalysisJob.DONE)
+        self.assertIsNotNone(job.finished_date)
+        build_word_properties.assert_called_once_with(
+            'Test Il fait beau.', 'fr', 'fi'
+        )
+
+        # a job that runs again replaces the vocabulary of the chapter
+        jobs.enqueue_analysis(self.chapter)
+        jobs.run_worker(once=True)
+        self.assertEqual(self.chapter.wordproperties_set.count(), 1)
+
+    @patch('vocabulary.helpers.jobs.analyze_chapter')
+    def test_failed_job(self, analyze_chapter):
+        """Test that errors during analysis mark the job failed"""
+        analyze_chapter.side_effect = RuntimeError('boom')
+        job = jobs.enqueue_analysis(self.chapter)
+
+        jobs.run_worker(once=True)
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, AnalysisJob.FAILED)
+        self.assertEqual(job.error, 'Analysis failed')
+        self.assertNotIn('boom', job.error)
+
+    @patch('vocabulary.helpers.jobs.analyze_chapter')
+    def test_requeue_stale_job(self, analyze_chapter):
+        """Test that jobs of a stopped worker are processed again, and
+        jobs with a recent heartbeat are left to their worker"""
+        analyze_chapter.return_value = False
+        stale = jobs.enqueue_analysis(self.chapter)
+        running = jobs.enqueue_analysis(self.chapter)
+        long_ago = timezone.now() - timedelta(hours=1)
+        AnalysisJob.objects.filter(pk=stale.pk).update(
+            status=AnalysisJob.RUNNING,
+            started_date=long_ago,
+            heartbeat_date=long_ago
+        )
+        AnalysisJob.objects.filter(pk=running.pk).update(
+            status=AnalysisJob.RUNNING,
+            started_date=long_ago,
+            heartbeat_date=timezone.now()
+        )
+
+        processed = jobs.run_worker(once=True)
+        stale.refresh_from_db()
+        running.refresh_from_db()
+
+        self.assertEqual(processed, 1)
+        analyze_chapter.assert_called_once_with(stale.chapter, job=stale)
+        self.assertEqual(running.status, AnalysisJob.RUNNING)
+
+    def test_beat(self):
+        """Test that the heartbeat of a running job is refreshed"""
+        jobs.enqueue_analysis(self.chapter)
+        job = jobs.claim_next_job()
+        AnalysisJob.objects.filter(pk=job.pk).update(heartbeat_date=None)
+        stop = Mock(wait=Mock(side_effect=[False, True]))
+
+        jobs.beat(job.pk, stop, interval=0)
+        job.refresh_from_db()
+
+        self.assertIsNotNone(job.heartbeat_date)
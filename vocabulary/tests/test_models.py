@@ -70,3 +70,15 @@ class ModelTests(TestCase):
             str(WordProperties._meta.verbose_name_plural),
             'Word Properties'
         )
+
+    def test_word_normalized_lemma(self):
+        """Test that the normalized lemma is stored on save"""
+        # 'É' written as 'E' followed by a combining acute accent
+        word = create_word(user=self.user, lemma='E\u0301t\u00e9')
+
+        self.assertEqual(word.normalized_lemma, '\u00e9t\u00e9')
+
+        word.lemma = 'Hiver'
+        word.save(update_fields=['lemma'])
+        word.refresh_from_db()
+        self.assertEqual(word.normalized_lemma, 'hiver')
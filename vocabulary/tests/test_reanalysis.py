@@ -0,0 +1,269 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from vocabulary.helpers import reanalysis
+from vocabulary.helpers.dictionary import snapshots
+from vocabulary.models import Chapter, WordProperties
+from vocabulary.tests.test_models import create_word, SOURCE, TARGET
+
+
+def analyze(segments, source_lang):
+    """Stand-in for analyze_segments that splits the text on spaces
+
+    A word may carry its part of speech as 'lemma/POS', NOUN otherwise;
+    the lemma gets the part of speech of its first occurrence
+    """
+    worddict = {}
+    for word in ' '.join(segments).split():
+        (lemma, _, pos) = word.partition('/')
+        properties = worddict.setdefault(
+            lemma, {'pos': pos or 'NOUN', 'count': 0}
+        )
+        properties['count'] += 1
+    return worddict
+
+
+class ReanalysisTests(TestCase):
+
+    def setUp(self):
+        snapshots.clear()
+        self.user = get_user_model().objects.create_user(
+            'testuser',
+            'testpass'
+        )
+        self.chat = create_word(
+            user=self.user, lemma='chat', translation='kissa', pos='NOUN'
+        )
+        self.chien = create_word(
+            user=self.user, lemma='chien', translation='koira', pos='NOUN'
+        )
+        self.maison = create_word(
+            user=self.user, lemma='maison', translation='talo', pos='NOUN'
+        )
+        self.chapter = Chapter.objects.create(
+            title='Titre',
+            body='chat chien\n\nchat\n\nmaison\n\nmaison',
+            source_lang=SOURCE,
+            target_lang=TARGET,
+            created_by=self.user
+        )
+        WordProperties.objects.create(
+            chapter=self.chapter, word=self.chat, frequency=2
+        )
+        WordProperties.objects.create(
+            chapter=self.chapter, word=self.chien, frequency=1
+        )
+        WordProperties.objects.create(
+            chapter=self.chapter, word=self.maison, frequency=2
+        )
+
+    def frequencies(self):
+        return dict(
+            self.chapter.wordproperties_set
+            .values_list('word__lemma', 'frequency')
+        )
+
+    def test_changed_segments(self):
+        """Test that only the differing paragraphs are returned"""
+        (removed, added) = reanalysis.changed_segments(
+            ['a', 'b', 'c'], ['a', 'x', 'c', 'd']
+        )
+
+        self.assertEqual(removed, ['b'])
+        self.assertEqual(added, ['x', 'd'])
+
+    @patch('vocabulary.helpers.reanalysis.analyze_segments')
+    def test_unchanged_text_not_analyzed(self, analyze_segments):
+        """Test that an edit without text changes runs no analysis"""
+        old_body = self.chapter.body
+
+        self.assertTrue(
+            reanalysis.reanalyze_chapter(self.chapter, 'Titre', old_body)
+        )
+        analyze_segments.assert_not_called()
+
+    @patch('vocabulary.helpers.reanalysis.analyze_segments',
+           side_effect=analyze)
+    def test_apply_frequency_deltas(self, analyze_segments):
+        """Test that only the changed paragraph is analyzed"""
+        old_body = self.chapter.body
+        self.chapter.body = 'chat chien\n\nchien\n\nmaison\n\nmaison'
+        self.chapter.save()
+
+        analyzed = reanalysis.reanalyze_chapter(
+            self.chapter, 'Titre', old_body
+        )
+
+        self.assertTrue(analyzed)
+        self.assertEqual(
+            [call.args[0] for call in analyze_segments.call_args_list],
+            [['chat'], ['chien']]
+        )
+        self.assertEqual(
+            self.frequencies(), {'chat': 1, 'chien': 2, 'maison': 2}
+        )
+
+    @patch('vocabulary.helpers.reanalysis.analyze_segments',
+           side_effect=analyze)
+    def test_words_added_and_removed(self, analyze_segments):
+        """Test that words leave and join the chapter with the text"""
+        WordProperties.objects.filter(word=self.chien).delete()
+        old_body = self.chapter.body
+        self.chapter.body = 'chat chien\n\nchat\n\nmaison\n\nchien'
+        self.chapter.save()
+
+        reanalysis.reanalyze_chapter(self.chapter, 'Titre', old_body)
+
+        self.assertEqual(
+            self.frequencies(), {'chat': 2, 'chien': 1, 'maison': 1}
+        )
+
+    @patch('vocabulary.helpers.reanalysis.analyze_segments',
+           side_effect=analyze)
+    def test_frequency_drops_to_zero(self, analyze_segments):
+        """Test that a word whose paragraphs are removed is deleted"""
+        old_body = self.chapter.body
+        self.chapter.body = 'chat chien\n\nchat'
+        self.chapter.save()
+
+        reanalysis.reanalyze_chapter(self.chapter, 'Titre', old_body)
+
+        self.assertNotIn('maison', self.frequencies())
+
+    @patch('vocabulary.helpers.reanalysis.analyze_segments',
+           side_effect=analyze)
+    def test_other_parts_of_speech_removed(self, analyze_segments):
+        """Test that words listed with zero frequency for another part of
+        speech go when their lemma leaves the text"""
+        maison = create_word(
+            user=self.user, lemma='maison', translation='kotoinen',
+            pos='ADJ'
+        )
+        WordProperties.objects.create(
+            chapter=self.chapter, word=maison, frequency=0
+        )
+        old_body = self.chapter.body
+        self.chapter.body = 'chat chien\n\nchat'
+        self.chapter.save()
+
+        reanalysis.reanalyze_chapter(self.chapter, 'Titre', old_body)
+
+        self.assertFalse(
+            self.chapter.wordproperties_set.filter(
+                word__lemma='maison'
+            ).exists()
+        )
+
+    @patch('vocabulary.helpers.reanalysis.build_word_properties')
+    @patch('vocabulary.helpers.reanalysis.analyze_segments',
+           side_effect=analyze)
+    def test_uncounted_word_reanalyzed(self, analyze_segments,
+                                       build_word_properties):
+        """Test that removing a word counted under no part of speech
+        analyzes the whole text"""
+        WordProperties.objects.filter(word=self.chien).update(frequency=0)
+        build_word_properties.return_value = [
+            WordProperties(word=self.chat, frequency=2)
+        ]
+        old_body = self.chapter.body
+        self.chapter.body = 'chat\n\nchat\n\nmaison\n\nmaison'
+        self.chapter.save()
+
+        reanalysis.reanalyze_chapter(self.chapter, 'Titre', old_body)
+
+        build_word_properties.assert_called_once()
+        self.assertEqual(self.frequencies(), {'chat': 2})
+
+    def add_ferme(self):
+        """List the lemma ferme as a noun with three occurrences and as an
+        adjective with zero frequency, as make_word_properties does"""
+        for (pos, frequency) in (('NOUN', 3), ('ADJ', 0)):
+            word = create_word(
+                user=self.user, lemma='ferme', translation=pos, pos=pos
+            )
+            WordProperties.objects.create(
+                chapter=self.chapter, word=word, frequency=frequency
+            )
+
+    @patch('vocabulary.helpers.reanalysis.analyze_segments',
+           side_effect=analyze)
+    def test_delta_on_counted_word(self, analyze_segments):
+        """Test that a delta changes the word that holds the count of its
+        lemma and keeps the words listed for other parts of speech"""
+        self.add_ferme()
+        old_body = self.chapter.body + '\n\nferme ferme/ADJ\n\nferme'
+        self.chapter.body += '\n\nferme'
+        self.chapter.save()
+
+        reanalysis.reanalyze_chapter(self.chapter, 'Titre', old_body)
+
+        self.assertEqual(
+            dict(
+                self.chapter.wordproperties_set.filter(word__lemma='ferme')
+                .values_list('word__pos', 'frequency')
+            ),
+            {'NOUN': 1, 'ADJ': 0}
+        )
+
+    @patch('vocabulary.helpers.reanalysis.build_word_properties',
+           return_value=None)
+    @patch('vocabulary.helpers.reanalysis.analyze_segments',
+           side_effect=analyze)
+    def test_other_part_of_speech_reanalyzed(self, analyze_segments,
+                                             build_word_properties):
+        """Test that removing or adding a paragraph where a lemma has
+        another part of speech than its counted word analyzes the whole
+        text"""
+        self.add_ferme()
+        body = self.chapter.body
+        edits = (
+            (body + '\n\nferme/ADJ ferme\n\nferme', body + '\n\nferme'),
+            (body + '\n\nferme', body + '\n\nferme\n\nferme/ADJ'),
+        )
+        for (old_body, new_body) in edits:
+            build_word_properties.reset_mock()
+            self.chapter.body = new_body
+
+            # the failed full analysis leaves the words for the next edit
+            analyzed = reanalysis.reanalyze_chapter(
+                self.chapter, 'Titre', old_body
+            )
+
+            self.assertFalse(analyzed)
+            build_word_properties.assert_called_once()
+
+    @patch('vocabulary.helpers.reanalysis.build_word_properties')
+    def test_full_reanalysis(self, build_word_properties):
+        """Test that a mostly rewritten chapter is analyzed again"""
+        build_word_properties.return_value = [
+            WordProperties(word=self.chien, frequency=5)
+        ]
+        old_body = self.chapter.body
+        self.chapter.body = 'chien'
+        self.chapter.save()
+
+        reanalysis.reanalyze_chapter(self.chapter, 'Titre', old_body)
+
+        build_word_properties.assert_called_once_with(
+            'Titre chien', SOURCE, TARGET
+        )
+        self.assertEqual(self.frequencies(), {'chien': 5})
+
+    @patch('vocabulary.helpers.reanalysis.analyze_segments',
+           return_value=None)
+    def test_not_analyzed(self, analyze_segments):
+        """Test that failed analysis leaves the word properties alone"""
+        old_body = self.chapter.body
+        self.chapter.body = 'chat chien\n\nchien\n\nmaison\n\nmaison'
+        self.chapter.save()
+
+        analyzed = reanalysis.reanalyze_chapter(
+            self.chapter, 'Titre', old_body
+        )
+
+        self.assertFalse(analyzed)
+        self.assertEqual(
+            self.frequencies(), {'chat': 2, 'chien': 1, 'maison': 2}
+        )
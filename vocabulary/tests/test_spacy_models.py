@@ -0,0 +1,94 @@
+import threading
+from unittest.mock import patch, Mock
+
+import pkg_resources
+
+from django.test import SimpleTestCase
+
+from vocabulary.helpers.spacy_models import ModelRegistry
+
+
+class ModelRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = ModelRegistry({'fr': 'fr_test_model'})
+
+    @patch('vocabulary.helpers.spacy_models.spacy.load')
+    def test_model_loaded_once(self, load):
+        """Test that repeated requests share one loaded pipeline"""
+        load.return_value = object()
+
+        nlp1 = self.registry.get('fr')
+        nlp2 = self.registry.get('fr', disable=['ner', 'parser'])
+
+        self.assertIs(nlp1, nlp2)
+        load.assert_called_once_with(
+            'fr_test_model', disable=['ner', 'parser']
+        )
+
+    @patch('vocabulary.helpers.spacy_models.spacy.load')
+    def test_disabled_components_are_part_of_key(self, load):
+        """Test that a different component set loads a separate pipeline"""
+        load.side_effect = lambda name, disable: object()
+
+        nlp1 = self.registry.get('fr')
+        nlp2 = self.registry.get('fr', disable=[])
+
+        self.assertIsNot(nlp1, nlp2)
+        self.assertEqual(load.call_count, 2)
+
+    @patch('vocabulary.helpers.spacy_models.spacy.load')
+    def test_concurrent_loads(self, load):
+        """Test that concurrent first requests trigger a single load"""
+        load.return_value = object()
+        results = []
+
+        def worker():
+            results.append(self.registry.get('fr'))
+
+        threads = [threading.Thread(target=worker) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(len(set(map(id, results))), 1)
+
+    @patch('vocabulary.helpers.spacy_models.spacy.load')
+    def test_stats(self, load):
+        """Test that load time and resident size are reported"""
+        load.return_value = object()
+        self.registry.get('fr')
+
+        stats = self.registry.stats()
+
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['lang'], 'fr')
+        self.assertEqual(stats[0]['package'], 'fr_test_model')
+        self.assertGreaterEqual(stats[0]['load_time'], 0)
+        self.assertGreaterEqual(stats[0]['resident_size'], 0)
+
+    def test_unknown_language(self):
+        """Test that an unsupported language is rejected"""
+        with self.assertRaises(LookupError):
+            self.registry.get('xx')
+
+    @patch('vocabulary.helpers.spacy_models.pkg_resources.get_distribution')
+    def test_version(self, get_distribution):
+        """Test that the model version comes from the package metadata,
+        looked up once"""
+        get_distribution.return_value = Mock(version='2.0.0')
+
+        self.assertEqual(self.registry.version('fr'), 'fr_test_model==2.0.0')
+        self.assertEqual(self.registry.version('fr'), 'fr_test_model==2.0.0')
+        get_distribution.assert_called_once_with('fr_test_model')
+        self.assertIsNone(self.registry.version('xx'))
+
+    @patch('vocabulary.helpers.spacy_models.pkg_resources.get_distribution',
+           side_effect=pkg_resources.DistributionNotFound)
+    def test_version_not_installed(self, get_distribution):
+        """Test that a model package without metadata has no version"""
+        self.assertEqual(
+            self.registry.version('fr'), 'fr_test_model==unknown'
+        )
@@ -0,0 +1,85 @@
+import io
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from vocabulary.helpers import word_io
+from vocabulary.models import Word
+from vocabulary.tests.test_models import create_word, SOURCE, TARGET
+
+
+class WordImportExportTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'testuser',
+            'testpass'
+        )
+
+    def test_import_words(self):
+        """Test inserting, updating and skipping imported words"""
+        create_word(user=self.user, lemma='chat', translation='kisu')
+        create_word(user=self.user, lemma='chien', translation='koira')
+        rows = [
+            {'lemma': 'chat', 'translation': 'kissa', 'pos': 'NOUN',
+             'source_lang': SOURCE, 'target_lang': TARGET},
+            {'lemma': 'chien', 'translation': 'koira', 'pos': 'NOUN',
+             'source_lang': SOURCE, 'target_lang': TARGET},
+            {'lemma': 'Été', 'translation': 'kesä', 'pos': 'NOUN',
+             'gender': 'm', 'source_lang': SOURCE, 'target_lang': TARGET},
+            {'lemma': 'bad', 'translation': 'x', 'pos': 'WRONG',
+             'source_lang': SOURCE, 'target_lang': TARGET},
+            None,
+        ]
+
+        counts = word_io.import_words(rows, user=self.user, batch_size=2)
+
+        self.assertEqual(counts, {'inserted': 1, 'updated': 1, 'skipped': 3})
+        self.assertEqual(
+            Word.objects.get(lemma='chat').translation, 'kissa'
+        )
+        ete = Word.objects.get(lemma='Été')
+        self.assertEqual(ete.normalized_lemma, 'été')
+        self.assertEqual(ete.created_by, self.user)
+
+    def test_export_import_round_trip(self):
+        """Test that exported words import back unchanged"""
+        create_word(user=self.user, lemma='chat', translation='kissa')
+        create_word(
+            user=self.user, lemma='belle', translation='kaunis', pos='ADJ',
+            gender='f', pronunciation='bɛl'
+        )
+
+        for format in word_io.FORMATS:
+            lines = ''.join(word_io.export_words(Word.objects.all(), format))
+            rows = word_io.read_words(io.StringIO(lines, newline=''), format)
+            counts = word_io.import_words(rows)
+            self.assertEqual(
+                counts, {'inserted': 0, 'updated': 0, 'skipped': 2}
+            )
+
+    def test_import_export_commands(self):
+        """Test the import_words and export_words commands"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'words.jsonl')
+            with open(path, 'w') as f:
+                f.write(
+                    '{"lemma": "chat", "translation": "kissa", '
+                    '"pos": "NOUN", "source_lang": "fr", '
+                    '"target_lang": "fi"}\n'
+                )
+            out = StringIO()
+            call_command('import_words', path, user='testuser', stdout=out)
+            self.assertIn('Inserted 1, updated 0, skipped 0', out.getvalue())
+
+            out = StringIO()
+            call_command('export_words', stdout=out)
+            self.assertEqual(out.getvalue().splitlines(), [
+                'lemma,translation,pos,gender,pronunciation,source_lang,'
+                'target_lang',
+                'chat,kissa,NOUN,,,fr,fi'
+            ])